@@ -47,6 +47,7 @@ def set_logging(log_path=None, log_level=logging.INFO, modules=(),
 # Create Flask application
 application = Flask('web')
 application.config.from_object(conf)
+application.config['USE_X_SENDFILE'] = conf.WEBSERVER_X_SENDFILE
 if os.environ.get('JARR_TESTING', False) == 'true':
     application.debug = True
     application.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
@@ -0,0 +1,197 @@
+"""
+asyncio flavour of the http crawler.
+
+The workflow is the one described in crawler.http_crawler :
+
+CrawlerScheduler.run
+    retreives the feeds to fetch and pass them to
+CrawlerScheduler.callback
+    which fetches each of them and hands the result to
+FeedCrawler.callback
+    which checks the etag / status code and has the feed parsed, then
+FeedCrawler.challenge
+    challenges jarr with the ids of the parsed entries, then
+JarrUpdater.callback
+    creates the missing entries and updates the feed
+
+Only the transport changes: every request is a task running on a single
+event loop and going through a shared aiohttp connector, which keeps
+connections alive and allows hundreds of requests to be in flight at once.
+Each distant host can't have more than conf.CRAWLER_HOST_CONCURRENCY
+requests running at the same time. What still blocks on I/O in the
+callbacks (resolving the links of the new articles, refreshing the
+metadata of a feed out of its site) is run in the default executor of the
+loop through run_blocking.
+"""
+
+import json
+import time
+import asyncio
+import logging
+import urllib
+from collections import defaultdict
+
+import aiohttp
+from requests.exceptions import HTTPError
+from requests.structures import CaseInsensitiveDict
+
+from bootstrap import conf, PARSED_PLATFORM_URL
+from web.lib.utils import default_handler
+from crawler import http_crawler
+from crawler.lib import feed_parsing, link_resolving
+
+logger = logging.getLogger(__name__)
+
+
+class Response:
+    """Holds a fully read aiohttp response and exposes it the way requests
+    does so that the callbacks can handle it without knowing the engine"""
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = str(url)
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError('%d Error for url: %s'
+                            % (self.status_code, self.url), response=self)
+
+
+class AioCrawler(http_crawler.AbstractCrawler):
+    loop = None
+    _session = None
+    _pending = set()
+    _semaphore = None
+    _host_semaphores = {}
+
+    @staticmethod
+    def get_session():
+        """Lazily builds the session and the semaphores shared by all the
+        crawlers, they are bound to the current event loop"""
+        cls = AioCrawler
+        if cls._session is None:
+            cls.loop = asyncio.get_event_loop()
+            connector = aiohttp.TCPConnector(verify_ssl=False, loop=cls.loop)
+            cls._session = aiohttp.ClientSession(connector=connector,
+                                                 loop=cls.loop)
+            cls._semaphore = asyncio.Semaphore(conf.CRAWLER_CONCURRENCY,
+                                               loop=cls.loop)
+            cls._host_semaphores = defaultdict(lambda: asyncio.Semaphore(
+                    conf.CRAWLER_HOST_CONCURRENCY, loop=cls.loop))
+            # calls to our own API are only bound by the global limit
+            cls._host_semaphores[PARSED_PLATFORM_URL.netloc] \
+                    = asyncio.Semaphore(conf.CRAWLER_CONCURRENCY,
+                                        loop=cls.loop)
+        return cls._session
+
+    async def _fetch(self, method, url, **kwargs):
+        response = await self.get_session().request(method, url, **kwargs)
+        content = await response.read()
+        return Response(response.url, response.status,
+                        response.headers, content)
+
+    async def _request(self, method, url, **kwargs):
+        host = urllib.parse.urlsplit(url).netloc
+        # acquiring the host slot first so that a crowded host
+        # won't hold global slots while waiting for its turn
+        with (await self._host_semaphores[host]), (await self._semaphore):
+            return await asyncio.wait_for(
+                    self._fetch(method, url, **kwargs),
+                    conf.CRAWLER_TIMEOUT, loop=self.loop)
+
+    def _watch(self, task, kind='requests'):
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return self.track(task, kind)
+
+    def _submit(self, method, url, kind='requests', **kwargs):
+        self.get_session()
+        return self._watch(asyncio.ensure_future(
+                self._request(method, url, **kwargs), loop=self.loop), kind)
+
+    def query_jarr(self, method, urn, data=None):
+        if data is None:
+            data = {}
+        return self._submit(method.upper(),
+                "%s%s/%s" % (self.url, conf.API_ROOT.strip('/'), urn),
+                auth=aiohttp.BasicAuth(*self.auth),
+                data=json.dumps(data, default=default_handler),
+                headers={'Content-Type': 'application/json',
+                         'User-Agent': conf.CRAWLER_USER_AGENT})
+
+    def http_get(self, url, headers):
+        return self._submit('GET', url, 'feeds', headers=headers)
+
+    def run_blocking(self, func, *args):
+        """Runs func in the default executor of the loop, so that its I/O
+        doesn't stall the requests in flight"""
+        self.get_session()
+        return self._watch(self.loop.run_in_executor(None, func, *args),
+                           'blocking')
+
+    def parse(self, content):
+        self.get_session()
+        return self._watch(asyncio.wrap_future(feed_parsing.submit(content),
+                                               loop=self.loop), 'parsing')
+
+    async def _drain(self, max_wait):
+        end = time.time() + max_wait
+        while sum(self.in_flight().values()):
+            remaining = end - time.time()
+            if remaining <= 0:
+                logger.warn('Exiting after %d seconds with %r in flight',
+                            max_wait, self.in_flight())
+                return False
+            if self._pending:
+                await asyncio.wait(list(self._pending), timeout=remaining,
+                                   loop=self.loop)
+            else:  # letting scheduled callbacks run
+                await asyncio.sleep(0, loop=self.loop)
+        return True
+
+    def wait(self, max_wait=300):
+        """Runs the loop until every request and the requests their
+        callbacks triggered are done"""
+        self.get_session()
+        return self.loop.run_until_complete(self._drain(max_wait))
+
+    async def _idle(self, timeout):
+        if self._pending:
+            await asyncio.wait(list(self._pending), timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED,
+                               loop=self.loop)
+        else:
+            await asyncio.sleep(timeout, loop=self.loop)
+
+    def idle(self, timeout):
+        self.get_session()
+        self.loop.run_until_complete(self._idle(timeout))
+
+    @classmethod
+    def close(cls):
+        if AioCrawler._session is not None:
+            AioCrawler._session.close()
+            AioCrawler._session = None
+        feed_parsing.shutdown()
+        link_resolving.shutdown()
+
+
+class JarrUpdater(AioCrawler, http_crawler.JarrUpdater):
+    pass
+
+
+class FeedCrawler(AioCrawler, http_crawler.FeedCrawler):
+    updater_cls = JarrUpdater
+
+
+class CrawlerScheduler(AioCrawler, http_crawler.CrawlerScheduler):
+    feed_crawler_cls = FeedCrawler
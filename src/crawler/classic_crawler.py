@@ -1,22 +1,34 @@
+"""
+The classic crawler, run in a separate process from the web application.
+
+Feeds are retreived concurrently over a single aiohttp session (no more
+than conf.CRAWLER_CONCURRENCY at once) and parsed in the pool of processes
+of crawler.lib.feed_parsing so that the event loop never blocks. The
+database work of a feed is made of one lookup of the known entries, one
+bulk update of the modified ones and one bulk insert of the new ones; it
+is done in a single dedicated thread so that sqlalchemy's session never
+crosses threads.
+"""
+
 import ssl
 import asyncio
 import logging
-import feedparser
-import dateutil.parser
+import aiohttp
 from bootstrap import conf
 from datetime import datetime
-from sqlalchemy import or_
+from concurrent.futures import ThreadPoolExecutor
 
 from bootstrap import db
-from web.models import User
+from web.models import User, Article
 from web.controllers import FeedController, ArticleController
-from web.lib.feed_utils import construct_feed_from, is_parsing_ok
-from crawler.lib.article_utils import construct_article, extract_id, \
-                                    get_article_content
+from web.lib.feed_utils import (construct_feed_from, is_parsing_ok,
+                                 get_metadata_hash, is_metadata_outdated)
+from crawler.lib import feed_parsing
+from crawler.lib.article_utils import (construct_article, construct_articles,
+                                      extract_id)
 
 logger = logging.getLogger(__name__)
-
-sem = asyncio.Semaphore(5)
+db_executor = ThreadPoolExecutor(max_workers=1)
 
 try:
     _create_unverified_https_context = ssl._create_unverified_context
@@ -28,103 +40,168 @@ else:
     ssl._create_default_https_context = _create_unverified_https_context
 
 
-async def get(*args, **kwargs):
-    # kwargs["connector"] = aiohttp.TCPConnector(verify_ssl=False)
+async def run_db(loop, func, *args):
+    """Runs func in the database thread, releasing its session after"""
+    def wrapper():
+        try:
+            return func(*args)
+        finally:
+            db.session.remove()
+    return await loop.run_in_executor(db_executor, wrapper)
+
+
+async def get(session, url, loop):
+    """Retreives url and parses it in the pool of processes"""
+    response = await asyncio.wait_for(session.get(url, headers={
+            'User-Agent': conf.CRAWLER_USER_AGENT}),
+            conf.CRAWLER_TIMEOUT, loop=loop)
     try:
-        data = feedparser.parse(args[0])
-        return data
-    except Exception as e:
-        raise e
+        content = await response.read()
+    finally:
+        response.close()
+    return await loop.run_in_executor(feed_parsing.get_executor(),
+                                      feed_parsing.parse, content)
 
 
-async def parse_feed(user, feed):
+async def parse_feed(session, sem, feed, loop):
     """
     Fetch a feed.
     Update the feed and return the articles.
     """
     parsed_feed = None
-    up_feed = {}
-    articles = []
+    up_feed = {'last_retrieved': datetime.utcnow()}
     with (await sem):
         try:
-            parsed_feed = await get(feed.link)
+            parsed_feed = await get(session, feed['link'], loop)
         except Exception as e:
             up_feed['last_error'] = str(e)
-            up_feed['error_count'] = feed.error_count + 1
-        finally:
-            up_feed['last_retrieved'] = datetime.utcnow()
-            if parsed_feed is None:
-                FeedController().update({'id': feed.id}, up_feed)
-                return
+            up_feed['error_count'] = feed['error_count'] + 1
+            await run_db(loop, FeedController().update,
+                         {'id': feed['id']}, up_feed)
+            return
 
     if not is_parsing_ok(parsed_feed):
         up_feed['last_error'] = str(parsed_feed['bozo_exception'])
-        up_feed['error_count'] = feed.error_count + 1
-        FeedController().update({'id': feed.id}, up_feed)
+        up_feed['error_count'] = feed['error_count'] + 1
+        await run_db(loop, FeedController().update,
+                     {'id': feed['id']}, up_feed)
         return
-    if parsed_feed['entries'] != []:
-        articles = parsed_feed['entries']
 
     up_feed['error_count'] = 0
     up_feed['last_error'] = ""
 
-    # Feed informations
-    construct_feed_from(feed.link, parsed_feed).update(up_feed)
-    if feed.title and 'title' in up_feed:
+    metadata_hash = get_metadata_hash(parsed_feed)
+    if not is_metadata_outdated(feed, metadata_hash):
+        return parsed_feed['entries'], up_feed
+
+    # Feed informations, construct_feed_from may query the site
+    fresh_feed = await loop.run_in_executor(
+            None, construct_feed_from, feed['link'], parsed_feed)
+    fresh_feed.update(up_feed)
+    fresh_feed['metadata_hash'] = metadata_hash
+    fresh_feed['metadata_refreshed'] = datetime.utcnow()
+    if feed['title'] and 'title' in fresh_feed:
         # do not override the title set by the user
-        del up_feed['title']
-    FeedController().update({'id': feed.id}, up_feed)
-
-    return articles
-
-
-async def insert_database(user, feed):
-
-    articles = await parse_feed(user, feed)
-    if None is articles:
-        return []
-
-    logger.debug('inserting articles for {}'.format(feed.title))
-
-    logger.info("Database insertion...")
+        del fresh_feed['title']
+    return parsed_feed['entries'], fresh_feed
+
+
+def _entry_key(ids):
+    return ('entry_id', ids['entry_id']) if ids.get('entry_id') \
+            else ('link', ids.get('link'))
+
+
+def match_entries(user_id, feed, entries):
+    """Splits entries between the new ones and the ones already stored,
+    returned along the article they match"""
+    art_contr = ArticleController(user_id)
+    by_key = {}
+    for entry in entries:
+        by_key.setdefault(_entry_key(extract_id(entry)), entry)
+
+    known_filters = []
+    for key in 'entry_id', 'link':
+        values = [value for key_, value in by_key if key_ == key]
+        if values:
+            known_filters.append({'%s__in' % key: values})
+    known = {}
+    if known_filters:
+        for article in art_contr.read(feed_id=feed['id'],
+                                      __or__=known_filters).with_entities(
+                Article.id, Article.entry_id, Article.link,
+                Article.title, Article.content):
+            known[_entry_key({'entry_id': article.entry_id,
+                              'link': article.link})] = article
+            known.setdefault(('link', article.link), article)
+
+    new_entries, known_entries = [], []
+    for key, entry in by_key.items():
+        if key in known:
+            known_entries.append((entry, known[key]))
+        else:
+            new_entries.append(entry)
+    return new_entries, known_entries
+
+
+def save_entries(user_id, feed, known_entries, creations, up_feed):
+    """Updates the modified entries of feed in one go, inserts the new
+    articles in another, then updates the feed."""
+    art_contr = ArticleController(user_id)
+    updates = []
+    for entry, existing in known_entries:
+        # the link of a known article has already been resolved
+        article = construct_article(entry, feed,
+                                    {entry.get('link'): existing.link})
+        logger.debug("Article %r (%r) already in the database.",
+                     article['title'], article['link'])
+        update = {}
+        if existing.title != article['title']:
+            update['title'] = article['title']
+        if existing.content != article['content']:
+            update['content'] = article['content']
+            update['readed'] = False
+        if update:
+            update['id'] = existing.id
+            updates.append(update)
+
+    art_contr.update_many(updates)
     new_articles = []
-    art_contr = ArticleController(user.id)
-    for article in articles:
-        existing_article_req = art_contr.read(feed_id=feed.id,
-                        **extract_id(article))
-        exist = existing_article_req.count() != 0
-        if exist:
-            existing_article = existing_article_req.first()
-            is_updated = False
-            logger.debug("Article %r (%r) already in the database.",
-                         article['title'], article['link'])
-            content = get_article_content(article)
-            if existing_article.title != article['title']:
-                existing_article.title = article['title']
-                is_updated = True
-            if existing_article.content != content:
-                existing_article.content = content
-                existing_article.readed = False
-                is_updated = True
-            if is_updated:
-                art_contr.update({'entry_id': existing_article.entry_id},
-                                 existing_article.dump())
-            continue
-        article = construct_article(article, feed.dump())
-        try:
-            new_articles.append(art_contr.create(**article))
-            logger.info("New article % (%r) added.",
-                        article['title'], article['link'])
-        except Exception:
-            logger.exception("Error when inserting article in database:")
-            continue
+    for article in art_contr.create_many(creations):
+        if isinstance(article, Exception):
+            logger.error("Error when inserting article in database: %r",
+                         article)
+        else:
+            new_articles.append(article)
+    FeedController().update({'id': feed['id']}, up_feed)
+    logger.info("%r: %d new articles, %d updated", feed['title'],
+                len(new_articles), len(updates))
     return new_articles
 
 
-async def init_process(user, feed):
+async def insert_database(session, sem, user, feed, loop):
+    result = await parse_feed(session, sem, feed, loop)
+    if result is None:
+        return []
+    entries, up_feed = result
+    new_entries, known_entries = await run_db(loop, match_entries,
+                                              user.id, feed, entries)
+    # resolving the links of the new articles may query distant sites,
+    # the database thread isn't held meanwhile
+    creations = await loop.run_in_executor(None, construct_articles,
+                                           new_entries, feed)
+    logger.debug('inserting articles for %s', feed['title'])
+    return await run_db(loop, save_entries, user.id, feed, known_entries,
+                        creations, up_feed)
+
+
+async def init_process(session, sem, user, feed, loop):
     # Fetch the feed and insert new articles in the database
-    articles = await insert_database(user, feed)
-    logger.debug('inserted articles for %s', feed.title)
+    try:
+        articles = await insert_database(session, sem, user, feed, loop)
+    except Exception:
+        logger.exception('an error occured while processing %r', feed['id'])
+        return []
+    logger.debug('inserted articles for %s', feed['title'])
     return articles
 
 
@@ -136,20 +213,27 @@ def retrieve_feed(loop, user, feed_id=None):
 
     # Get the list of feeds to fetch
     user = User.query.filter(User.email == user.email).first()
-    feeds = [feed for feed in user.feeds if
+    feeds = [feed.dump() for feed in user.feeds if
              feed.error_count <= conf.FEED_ERROR_MAX and feed.enabled]
     if feed_id is not None:
-        feeds = [feed for feed in feeds if feed.id == feed_id]
+        feeds = [feed for feed in feeds if feed['id'] == feed_id]
 
     if feeds == []:
         return
 
+    sem = asyncio.Semaphore(conf.CRAWLER_CONCURRENCY, loop=loop)
+    connector = aiohttp.TCPConnector(verify_ssl=False, loop=loop)
+    session = aiohttp.ClientSession(connector=connector, loop=loop)
     # Launch the process for all the feeds
-    tasks = [asyncio.ensure_future(init_process(user, feed)) for feed in feeds]
+    tasks = [asyncio.ensure_future(init_process(session, sem, user, feed,
+                                                loop), loop=loop)
+             for feed in feeds]
 
     try:
-        loop.run_until_complete(asyncio.wait(tasks))
+        loop.run_until_complete(asyncio.wait(tasks, loop=loop))
     except Exception:
         logger.exception('an error occured')
+    finally:
+        session.close()
 
     logger.info("All articles retrieved. End of the processus.")
@@ -0,0 +1,143 @@
+"""
+In process backend for the http crawler.
+
+On single host installations the crawler doesn't need to go through the
+REST API of jarr (serialization, HTTP, authentication, argument parsing):
+the crawlers of this module answer query_jarr by calling the controllers
+directly, within the thread pool of the crawler. Feeds are still fetched
+through the transport of the chosen engine. The REST API remains the way
+to go for remote crawlers.
+"""
+
+import re
+import asyncio
+import logging
+from requests.exceptions import HTTPError
+from werkzeug.exceptions import HTTPException
+
+from bootstrap import db
+from web.controllers import FeedController, ArticleController
+from crawler import http_crawler, aio_crawler
+
+logger = logging.getLogger(__name__)
+
+
+class Response:
+    """Carries the result of a controller call the way requests' response
+    would carry the json answer of the API"""
+    headers = {}
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError('%d Error: %s' % (self.status_code, self.data),
+                            response=self)
+
+
+def get_fetchable(data):
+    args = {key: data[key] for key in ('max_error', 'limit', 'refresh_rate')
+            if key in data}
+    feeds = [feed.dump() for feed in FeedController().list_fetchable(**args)]
+    return (feeds, 200) if feeds else (None, 204)
+
+
+def challenge(data):
+    result = ArticleController().batch_challenge(data.get('ids', []))
+    return (result, 200) if result else (None, 204)
+
+
+def create_articles(data):
+    # the created articles are dumped right away, reloading each of them
+    # once the transaction is committed would be wasted queries
+    session = db.session()
+    session.expire_on_commit = False
+    try:
+        results = ArticleController().create_many(data)
+    finally:
+        session.expire_on_commit = True
+    fail_count = sum(isinstance(res, Exception) for res in results)
+    status = 500 if fail_count == len(results) else 206 if fail_count else 200
+    return [str(res) if isinstance(res, Exception) else res.dump()
+            for res in results], status
+
+
+def update_feed(data, feed_id):
+    return FeedController().update({'id': int(feed_id)}, data), 200
+
+
+ROUTES = (('get', re.compile(r'^feeds/fetchable$'), get_fetchable),
+          ('get', re.compile(r'^articles/challenge$'), challenge),
+          ('post', re.compile(r'^articles$'), create_articles),
+          ('put', re.compile(r'^feed/(?P<feed_id>\d+)$'), update_feed))
+
+
+def call_controller(method, urn, data):
+    """Calls the controller that the API would have called for method and
+    urn and returns a Response"""
+    try:
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(urn)
+            if route_method == method.lower() and match:
+                return Response(*reversed(handler(data, **match.groupdict())))
+        return Response(404, 'no route for %s %s' % (method, urn))
+    except HTTPException as error:
+        db.session.rollback()
+        return Response(error.code, str(error))
+    except AssertionError as error:
+        db.session.rollback()
+        return Response(400, str(error))
+    except Exception as error:
+        logger.exception('%s %s failed:', method, urn)
+        db.session.rollback()
+        return Response(500, str(error))
+    finally:
+        # releasing the connection held by this thread's session
+        db.session.remove()
+
+
+class DbCrawler(http_crawler.AbstractCrawler):
+
+    def query_jarr(self, method, urn, data=None):
+        return self.track(self.pool.submit(call_controller, method, urn,
+                                           {} if data is None else data))
+
+
+class JarrUpdater(DbCrawler, http_crawler.JarrUpdater):
+    pass
+
+
+class FeedCrawler(DbCrawler, http_crawler.FeedCrawler):
+    updater_cls = JarrUpdater
+
+
+class CrawlerScheduler(DbCrawler, http_crawler.CrawlerScheduler):
+    feed_crawler_cls = FeedCrawler
+
+
+class AioDbCrawler(aio_crawler.AioCrawler):
+    """Controllers are still called within the thread pool, the loop being
+    notified of their completion"""
+
+    def query_jarr(self, method, urn, data=None):
+        self.get_session()
+        future = self.pool.submit(call_controller, method, urn,
+                                  {} if data is None else data)
+        return self._watch(asyncio.wrap_future(future, loop=self.loop))
+
+
+class AioJarrUpdater(AioDbCrawler, aio_crawler.JarrUpdater):
+    pass
+
+
+class AioFeedCrawler(AioDbCrawler, aio_crawler.FeedCrawler):
+    updater_cls = AioJarrUpdater
+
+
+class AioCrawlerScheduler(AioDbCrawler, aio_crawler.CrawlerScheduler):
+    feed_crawler_cls = AioFeedCrawler
@@ -6,8 +6,10 @@ CrawlerScheduler.run
 CrawlerScheduler.callback
     which will retreive each feed and treat result with
 FeedCrawler.callback
-    which will interprete the result (status_code, etag) collect ids
-    and match them agaisnt jarr which will cause
+    which will interprete the result (status_code, etag) and have the feed
+    parsed in a pool of processes before
+FeedCrawler.challenge
+    collects ids and match them agaisnt jarr which will cause
 JarrUpdater.callback
     to create the missing entries
 """
@@ -15,31 +17,90 @@ JarrUpdater.callback
 import html
 import time
 import json
+import signal
 import logging
-import feedparser
+import threading
 from bootstrap import conf
 from time import strftime, gmtime
-from datetime import datetime, timedelta
-from concurrent.futures import wait, ThreadPoolExecutor
+from datetime import datetime
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests_futures.sessions import FuturesSession
 from web.lib.utils import default_handler, to_hash
-from web.lib.feed_utils import construct_feed_from
-from crawler.lib.article_utils import extract_id, construct_article
+from web.lib.feed_utils import (construct_feed_from, get_metadata_hash,
+                                 is_metadata_outdated)
+from crawler.lib import feed_parsing, link_resolving
+from crawler.lib.article_utils import extract_id, construct_articles
 
 logger = logging.getLogger(__name__)
 logging.captureWarnings(True)
+IDLE_WAIT = 30  # seconds to wait in daemon mode when no feed is fetchable
+REPORT_INTERVAL = 300  # seconds between two throughput reports
+DAEMON_TICK = 1  # max time the daemon will block without checking signals
 
 
 class AbstractCrawler:
     pool = ThreadPoolExecutor(max_workers=conf.CRAWLER_NBWORKER)
     session = FuturesSession(executor=pool)
-    _futures = []
+    # one kept alive connection per worker, requests default to 10
+    session.mount('http://', HTTPAdapter(pool_maxsize=conf.CRAWLER_NBWORKER))
+    session.mount('https://', HTTPAdapter(pool_maxsize=conf.CRAWLER_NBWORKER))
+    # counts of what's running, a request or callback is only
+    # forgotten once it's done; _tracking is notified on each release
+    _in_flight = Counter()
+    _processed = Counter()
+    _tracking = threading.Condition()
 
     def __init__(self, auth):
         self.auth = auth
         self.session.verify = False
         self.url = conf.PLATFORM_URL
 
+    @classmethod
+    def _acquire(cls, kind):
+        with cls._tracking:
+            cls._in_flight[kind] += 1
+
+    @classmethod
+    def _release(cls, kind):
+        with cls._tracking:
+            cls._in_flight[kind] -= 1
+            cls._processed[kind] += 1
+            cls._tracking.notify_all()
+
+    @classmethod
+    def in_flight(cls):
+        """Returns the counts of running requests and pending callbacks"""
+        with cls._tracking:
+            return dict(cls._in_flight)
+
+    @classmethod
+    def processed(cls):
+        """Returns the counts of what has been processed since startup"""
+        with cls._tracking:
+            return dict(cls._processed)
+
+    def track(self, future, kind='requests'):
+        """Will count future as in flight until it's done"""
+        self._acquire(kind)
+        future.add_done_callback(lambda _: self._release(kind))
+        return future
+
+    def add_callback(self, future, callback):
+        """Adds callback to future, counting it as in flight until it has
+        been executed so that the requests it triggers are accounted for
+        before the future itself is released."""
+        self._acquire('callbacks')
+
+        def wrapper(fut):
+            try:
+                callback(fut)
+            finally:
+                self._release('callbacks')
+        future.add_done_callback(wrapper)
+        return future
+
     def query_jarr(self, method, urn, data=None):
         """A wrapper for internal call, method should be ones you can find
         on requests (header, post, get, options, ...), urn the distant
@@ -48,33 +109,58 @@ class AbstractCrawler:
         if data is None:
             data = {}
         method = getattr(self.session, method)
-        future = method("%s%s/%s" % (self.url, conf.API_ROOT.strip('/'), urn),
-                        auth=self.auth,
-                        data=json.dumps(data, default=default_handler),
-                        headers={'Content-Type': 'application/json',
-                                 'User-Agent': conf.CRAWLER_USER_AGENT})
-        self._futures.append(future)
+        return self.track(method(
+                "%s%s/%s" % (self.url, conf.API_ROOT.strip('/'), urn),
+                auth=self.auth,
+                data=json.dumps(data, default=default_handler),
+                headers={'Content-Type': 'application/json',
+                         'User-Agent': conf.CRAWLER_USER_AGENT}))
+
+    def run_blocking(self, func, *args):
+        """Returns a future of the result of func, which may block on I/O.
+        The callbacks already run in the pool of threads, func is simply
+        called."""
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as error:
+            future.set_exception(error)
         return future
 
-    def wait(self, max_wait=300, checks=10, wait_for=5):
-        checked, second_waited = 0, 0
-        start = datetime.now()
-        max_wait_delta = timedelta(seconds=max_wait)
-        while True:
-            time.sleep(wait_for)
-            if datetime.now() - start > max_wait_delta:
-                logger.warn('Exiting after %d seconds', second_waited)
-                break
-            try:  # no idea why wait throw ValueError around
-                not_done = len(wait(self._futures, timeout=max_wait).not_done)
-            except ValueError:
-                not_done = 1
-            if not_done != 0:
-                checked = 0
-                continue
-            checked += 1
-            if checked >= checks:
-                break
+    def http_get(self, url, headers):
+        """Will GET a distant resource (a feed) outside of jarr"""
+        return self.track(self.session.get(url, headers=headers), 'feeds')
+
+    def parse(self, content):
+        """Will parse the content of a feed in the pool of processes"""
+        return self.track(feed_parsing.submit(content), 'parsing')
+
+    @classmethod
+    def close(cls):
+        """Releases the resources shared by the crawlers"""
+        cls.pool.shutdown()
+        feed_parsing.shutdown()
+        link_resolving.shutdown()
+
+    def idle(self, timeout):
+        """Blocks until some work is done or timeout is reached"""
+        with self._tracking:
+            self._tracking.wait(timeout)
+
+    def wait(self, max_wait=300):
+        """Blocks until every request and every callback (and so the
+        requests they triggered) are done, or until max_wait seconds have
+        passed. Returns True if everything has been processed."""
+        end = time.time() + max_wait
+        with self._tracking:
+            while sum(self._in_flight.values()):
+                remaining = end - time.time()
+                if remaining <= 0:
+                    logger.warn('Exiting after %d seconds with %r in flight',
+                                max_wait, dict(self._in_flight))
+                    return False
+                self._tracking.wait(remaining)
+        return True
 
 
 class JarrUpdater(AbstractCrawler):
@@ -86,10 +172,26 @@ class JarrUpdater(AbstractCrawler):
         self.parsed_feed = parsed_feed
         super().__init__(auth)
 
+    def refresh_metadata(self):
+        """Returns the metadata of the feed that changed, built from the
+        parsed feed and the site it belongs to"""
+        up_feed = {}
+        fresh_feed = construct_feed_from(url=self.feed['link'],
+                                         fp_parsed=self.parsed_feed)
+        if fresh_feed.get('description'):
+            fresh_feed['description'] \
+                    = html.unescape(fresh_feed['description'])
+
+        for key in ('description', 'site_link', 'icon_url'):
+            if fresh_feed.get(key) and fresh_feed[key] != self.feed.get(key):
+                up_feed[key] = fresh_feed[key]
+        if not self.feed.get('title'):
+            up_feed['title'] = html.unescape(fresh_feed.get('title', ''))
+        return up_feed
+
     def callback(self, response):
         """Will process the result from the challenge, creating missing article
         and updating the feed"""
-        article_created = False
         try:
             response = response.result()
             response.raise_for_status()
@@ -98,21 +200,44 @@ class JarrUpdater(AbstractCrawler):
             # ignore error on when contacting JARR
             # leave it to the next iteration
             return
-        if response.status_code != 204:
-            results = response.json()
-            logger.debug('%r %r - %d entries were not matched '
-                         'and will be created',
-                         self.feed['id'], self.feed['title'], len(results))
-            for id_to_create in results:
-                article_created = True
-                entry = construct_article(
-                        self.entries[tuple(sorted(id_to_create.items()))],
-                        self.feed)
-                logger.info('%r %r - creating %r for %r - %r', self.feed['id'],
-                            self.feed['title'], entry['title'],
-                            entry['user_id'], id_to_create)
-                self.query_jarr('post', 'article', entry)
+        if response.status_code == 204:
+            self.refresh_feed(article_created=False)
+            return
+        results = response.json()
+        logger.debug('%r %r - %d entries were not matched '
+                     'and will be created',
+                     self.feed['id'], self.feed['title'], len(results))
+        entries = [self.entries[tuple(sorted(id_to_create.items()))]
+                   for id_to_create in results]
+        # resolving the links of the articles may query distant sites
+        future = self.run_blocking(construct_articles, entries, self.feed)
+        self.add_callback(future, lambda future: self.create_articles(
+                future, results))
 
+    def create_articles(self, new_entries, results):
+        """Pushes the articles built out of the unmatched entries to jarr"""
+        try:
+            new_entries = new_entries.result()
+        except Exception:
+            logger.exception('%r %r - failed to build articles',
+                             self.feed['id'], self.feed['title'])
+            return
+        for id_to_create, entry in zip(results, new_entries):
+            logger.info('%r %r - creating %r for %r - %r', self.feed['id'],
+                        self.feed['title'], entry['title'],
+                        entry['user_id'], id_to_create)
+        if new_entries:
+            self.query_jarr('post', 'articles', new_entries)
+        self.refresh_feed(article_created=bool(new_entries))
+
+    def refresh_feed(self, article_created):
+        future = self.run_blocking(self.get_up_feed)
+        self.add_callback(future, lambda future: self.update_feed(
+                future, article_created))
+
+    def get_up_feed(self):
+        """Returns the up to date attributes of the feed, refreshing its
+        metadata may query its site"""
         logger.debug('%r %r - updating feed etag %r last_mod %r',
                      self.feed['id'], self.feed['title'],
                      self.headers.get('etag', ''),
@@ -122,21 +247,22 @@ class JarrUpdater(AbstractCrawler):
                    'etag': self.headers.get('etag', ''),
                    'last_modified': self.headers.get('last-modified',
                                     strftime('%a, %d %b %Y %X %Z', gmtime()))}
-        fresh_feed = construct_feed_from(url=self.feed['link'],
-                                         fp_parsed=self.parsed_feed)
-        if fresh_feed.get('description'):
-            fresh_feed['description'] \
-                    = html.unescape(fresh_feed['description'])
-
-        for key in ('description', 'site_link', 'icon_url'):
-            if fresh_feed.get(key) and fresh_feed[key] != self.feed.get(key):
-                up_feed[key] = fresh_feed[key]
-        if not self.feed.get('title'):
-            up_feed['title'] = html.unescape(fresh_feed.get('title', ''))
+        metadata_hash = get_metadata_hash(self.parsed_feed)
+        if is_metadata_outdated(self.feed, metadata_hash):
+            up_feed.update(self.refresh_metadata())
+            up_feed['metadata_hash'] = metadata_hash
+            up_feed['metadata_refreshed'] = datetime.utcnow()
         up_feed['user_id'] = self.feed['user_id']
-        # re-getting that feed earlier since new entries appeared
-        if article_created:
-            up_feed['last_retrieved'] = datetime.utcnow()
+        return up_feed
+
+    def update_feed(self, up_feed, article_created):
+        """Pushes the attributes of the feed that changed to jarr"""
+        try:
+            up_feed = up_feed.result()
+        except Exception:
+            logger.exception('%r %r - failed to update feed attributes',
+                             self.feed['id'], self.feed['title'])
+            return
 
         diff_keys = {key for key in up_feed
                      if up_feed[key] != self.feed.get(key)}
@@ -153,9 +279,11 @@ class JarrUpdater(AbstractCrawler):
 
 
 class FeedCrawler(AbstractCrawler):
+    updater_cls = JarrUpdater
 
     def __init__(self, feed, auth):
         self.feed = feed
+        self.headers = None
         super().__init__(auth)
 
     def clean_feed(self):
@@ -209,8 +337,18 @@ class FeedCrawler(AbstractCrawler):
         logger.info('%r %r - cache validation failed, challenging entries',
                     self.feed['id'], self.feed['title'])
 
+        self.headers = response.headers
+        self.add_callback(self.parse(response.content), self.challenge)
+
+    def challenge(self, parsed_response):
+        """Will challenge jarr with the ids of the parsed entries"""
+        try:
+            parsed_response = parsed_response.result()
+        except Exception:
+            logger.exception('%r %r - parsing failed',
+                             self.feed['id'], self.feed['title'])
+            return
         ids, entries = [], {}
-        parsed_response = feedparser.parse(response.content)
         for entry in parsed_response['entries']:
             entry_ids = extract_id(entry)
             entry_ids['feed_id'] = self.feed['id']
@@ -220,15 +358,18 @@ class FeedCrawler(AbstractCrawler):
         logger.debug('%r %r - found %d entries %r',
                      self.feed['id'], self.feed['title'], len(ids), ids)
         future = self.query_jarr('get', 'articles/challenge', {'ids': ids})
-        updater = JarrUpdater(self.feed, entries, response.headers,
-                               parsed_response, self.auth)
-        future.add_done_callback(updater.callback)
+        updater = self.updater_cls(self.feed, entries, self.headers,
+                                   parsed_response, self.auth)
+        self.add_callback(future, updater.callback)
 
 
 class CrawlerScheduler(AbstractCrawler):
+    feed_crawler_cls = FeedCrawler
 
     def __init__(self, username, password):
         self.auth = (username, password)
+        self.polling, self.last_fetched = False, 0
+        self.stopping = False
         super(CrawlerScheduler, self).__init__(self.auth)
 
     def prepare_headers(self, feed):
@@ -254,20 +395,72 @@ class CrawlerScheduler(AbstractCrawler):
             logger.debug("No feed to fetch")
             return
         feeds = response.json()
+        self.last_fetched = len(feeds)
         logger.debug('%d to fetch %r', len(feeds), feeds)
         for feed in feeds:
             logger.debug('%r %r - fetching resources',
                          feed['id'], feed['title'])
-            future = self.session.get(feed['link'],
-                                      headers=self.prepare_headers(feed))
-            self._futures.append(future)
+            future = self.http_get(feed['link'], self.prepare_headers(feed))
 
-            feed_crwlr = FeedCrawler(feed, self.auth)
-            future.add_done_callback(feed_crwlr.callback)
+            feed_crwlr = self.feed_crawler_cls(feed, self.auth)
+            self.add_callback(future, feed_crwlr.callback)
+
+    def _poll_callback(self, response):
+        try:
+            self.callback(response)
+        finally:
+            self.polling = False
 
     def run(self, **kwargs):
         """entry point, will retreive feeds to be fetch
         and launch the whole thing"""
         logger.debug('retreving fetchable feed')
+        self.polling, self.last_fetched = True, 0
         future = self.query_jarr('get', 'feeds/fetchable', kwargs)
-        future.add_done_callback(self.callback)
+        self.add_callback(future, self._poll_callback)
+        return future
+
+    def stop(self, signum=None, frame=None):
+        logger.warn('stopping crawler (signal %r)', signum)
+        self.stopping = True
+
+    def report(self, start, processed_at_start=0):
+        """Logs and returns the number of feeds processed by second"""
+        elapsed = time.time() - start
+        processed = self.processed().get('feeds', 0) - processed_at_start
+        rate = processed / elapsed if elapsed else 0.
+        logger.info('%d feeds processed in %ds (%.2f feeds/s), in flight %r',
+                    processed, elapsed, rate, self.in_flight())
+        return rate
+
+    def run_forever(self, capacity, idle_wait=IDLE_WAIT, max_wait=300,
+                    **kwargs):
+        """Daemon mode, will keep up to capacity feeds in flight, asking
+        jarr for new feeds as soon as slots are freed. Should jarr not
+        provide as many feeds as asked, it won't be asked again before
+        idle_wait seconds. Stops on SIGTERM or SIGINT after letting the
+        feeds in flight be processed (for max_wait seconds at most)."""
+        handlers = {signum: signal.signal(signum, self.stop)
+                    for signum in (signal.SIGTERM, signal.SIGINT)}
+        start = next_report = time.time()
+        processed_at_start = self.processed().get('feeds', 0)
+        next_poll, asked = 0, 0
+        try:
+            while not self.stopping:
+                now = time.time()
+                free = capacity - self.in_flight().get('feeds', 0)
+                if not self.polling and free > 0 and now >= next_poll:
+                    if self.last_fetched < asked:  # jarr ran out of feeds
+                        next_poll, asked = now + idle_wait, 0
+                    else:
+                        asked = free
+                        self.run(limit=free, **kwargs)
+                if now >= next_report:
+                    self.report(start, processed_at_start)
+                    next_report = now + REPORT_INTERVAL
+                self.idle(DAEMON_TICK)
+            self.wait(max_wait)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        return self.report(start, processed_at_start)
@@ -1,12 +1,12 @@
 import html
 import logging
-import requests
 import dateutil.parser
 from datetime import datetime, timezone
 
 from bootstrap import conf
 from web.lib.utils import to_hash
 from web.lib.article_cleaner import clean_urls
+from crawler.lib import link_resolving
 
 logger = logging.getLogger(__name__)
 
@@ -32,8 +32,19 @@ def extract_id(entry, keys=[('link', 'link')], force_id=False):
         return ids
 
 
-def construct_article(entry, feed):
-    "Safe method to transorm a feedparser entry into an article"
+def construct_articles(entries, feed):
+    """Transforms entries into articles of feed, resolving their links in a
+    single batch"""
+    links = {}
+    if conf.CRAWLER_RESOLV and entries:
+        links = link_resolving.resolve_many(
+                [entry.get('link') for entry in entries])
+    return [construct_article(entry, feed, links) for entry in entries]
+
+
+def construct_article(entry, feed, links=None):
+    """Safe method to transorm a feedparser entry into an article, links
+    may hold the already resolved links"""
     now = datetime.utcnow()
     date = None
     for date_key in ('published', 'created', 'date'):
@@ -47,7 +58,7 @@ def construct_article(entry, feed):
                 break
 
     content = get_article_content(entry)
-    link = get_article_link(entry)
+    link = get_article_link(entry, links)
     content = clean_urls(content, link)
 
     return {'feed_id': feed['id'],
@@ -68,14 +79,11 @@ def get_article_content(entry):
     return content
 
 
-def get_article_link(entry):
+def get_article_link(entry, links=None):
     article_link = entry.get('link')
     if conf.CRAWLER_RESOLV and article_link:
-        try:
-            # resolves URL behind proxies (like feedproxy.google.com)
-            response = requests.get(article_link, verify=False, timeout=5.0)
-            article_link = response.url
-        except Exception as error:
-            logger.warning("Unable to get the real URL of %s. Error: %s",
-                           article_link, error)
+        # resolves URL behind proxies (like feedproxy.google.com)
+        if links is None or article_link not in links:
+            links = link_resolving.resolve_many([article_link])
+        article_link = links[article_link]
     return article_link
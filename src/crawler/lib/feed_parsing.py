@@ -0,0 +1,67 @@
+"""
+Parsing of the feeds out of the I/O threads and event loop.
+
+feedparser is pure python and CPU bound, the crawlers hand it over to a
+pool of processes (conf.CRAWLER_PARSE_WORKERS of them, as many as there are
+cores by default). The parsed feed is sent back as plain dicts and lists
+holding only what the crawlers and construct_feed_from actually read,
+which is way lighter to pickle than the whole FeedParserDict.
+"""
+
+import os
+import logging
+import feedparser
+from concurrent.futures import ProcessPoolExecutor
+
+from bootstrap import conf
+
+logger = logging.getLogger(__name__)
+FEED_KEYS = ('title', 'subtitle', 'link', 'href', 'icon')
+ENTRY_KEYS = ('id', 'entry_id', 'link', 'title', 'summary',
+              'published', 'created', 'date', 'updated')
+_executor = None
+
+
+def _pick(source, keys):
+    return {key: source[key] for key in keys if source.get(key) is not None}
+
+
+def compact_entry(entry):
+    compacted = _pick(entry, ENTRY_KEYS)
+    if entry.get('content'):
+        compacted['content'] = [{'value': entry['content'][0]['value']}]
+    return compacted
+
+
+def parse(content):
+    """Parses content (or retreives and parses it if it's an url) and
+    returns its compact form"""
+    parsed = feedparser.parse(content)
+    bozo_exception = parsed.get('bozo_exception')
+    return {'bozo': bool(parsed.get('bozo')),
+            'bozo_exception': None if bozo_exception is None
+                              else str(bozo_exception),
+            'feed': _pick(parsed.get('feed', {}), FEED_KEYS),
+            'entries': [compact_entry(entry)
+                        for entry in parsed.get('entries', [])]}
+
+
+def get_executor():
+    """Lazily builds the pool of processes the feeds are parsed in"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+                max_workers=conf.CRAWLER_PARSE_WORKERS or os.cpu_count())
+    return _executor
+
+
+def submit(content):
+    """Will parse content within the pool, returns a future"""
+    return get_executor().submit(parse, content)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
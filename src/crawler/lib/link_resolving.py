@@ -0,0 +1,166 @@
+"""
+Resolution of the links of the articles hidden behind proxies.
+
+With conf.CRAWLER_RESOLV, the link of an article is replaced by the url it
+redirects to (feedproxy.google.com and the like). The links of all the new
+entries of a feed are resolved in one batch, by a pool of threads of
+conf.CRAWLER_RESOLV_WORKERS, no more than conf.CRAWLER_HOST_CONCURRENCY
+requests being made to a given host at once. Only the headers are
+retrieved: a HEAD request, or a streamed GET closed right away for the
+servers refusing HEAD. Resolved links are kept for
+conf.CRAWLER_RESOLV_CACHE_TTL seconds in a dbm file at
+conf.CRAWLER_RESOLV_CACHE, shared by the runs of the crawler. The file is
+only opened for the time of a lookup or a write, as several crawlers may
+run at once; should it be unavailable (locked by another process,
+corrupted) the links are simply resolved again. Expired entries are
+deleted when found and, every CACHE_PURGE_INTERVAL seconds, all at once.
+"""
+
+import dbm
+import os
+import time
+import logging
+import threading
+import urllib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bootstrap import conf
+
+logger = logging.getLogger(__name__)
+REQUESTS_KWARGS = {'headers': {'User-Agent': conf.CRAWLER_USER_AGENT},
+                   'verify': False, 'allow_redirects': True}
+CACHE_PURGE_INTERVAL = 3600
+_executor = None
+_cache_lock = threading.Lock()
+_last_purge = 0
+_host_locks_lock = threading.Lock()
+_host_locks = {}
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+                max_workers=conf.CRAWLER_RESOLV_WORKERS)
+    return _executor
+
+
+def _open_cache():
+    os.makedirs(os.path.dirname(conf.CRAWLER_RESOLV_CACHE), exist_ok=True)
+    return dbm.open(conf.CRAWLER_RESOLV_CACHE, 'c')
+
+
+def _is_expired(value, now):
+    try:
+        return float(value.decode('utf8').split(' ', 1)[0]) <= now
+    except ValueError:
+        return True
+
+
+def _purge(cache, now):
+    """Deletes the expired entries of cache"""
+    for key in [key for key in cache.keys() if _is_expired(cache[key], now)]:
+        del cache[key]
+    if hasattr(cache, 'reorganize'):  # gdbm doesn't shrink by itself
+        cache.reorganize()
+
+
+def _get_host_lock(url):
+    host = urllib.parse.urlsplit(url).netloc
+    with _host_locks_lock:
+        if host not in _host_locks:
+            _host_locks[host] = threading.BoundedSemaphore(
+                    conf.CRAWLER_HOST_CONCURRENCY)
+        return _host_locks[host]
+
+
+def _request(method, url):
+    response = requests.request(method, url, stream=True,
+                                timeout=conf.CRAWLER_TIMEOUT,
+                                **REQUESTS_KWARGS)
+    response.close()
+    return response
+
+
+def resolve(url):
+    """Returns the url url redirects to, None if it couldn't be reached"""
+    try:
+        with _get_host_lock(url):
+            response = _request('head', url)
+            if response.status_code >= 400:
+                # some servers do not implement HEAD
+                response = _request('get', url)
+        response.raise_for_status()
+        return response.url
+    except Exception as error:
+        logger.warning("Unable to get the real URL of %s. Error: %s",
+                       url, error)
+        return None
+
+
+def get_cached(urls):
+    """Returns the already resolved urls among urls"""
+    now, resolved = time.time(), {}
+    try:
+        with _cache_lock:
+            cache = _open_cache()
+            try:
+                for url in urls:
+                    key = url.encode('utf8')
+                    value = cache.get(key)
+                    if value is None:
+                        continue
+                    if _is_expired(value, now):
+                        del cache[key]
+                        continue
+                    resolved[url] = value.decode('utf8').split(' ', 1)[1]
+            finally:
+                cache.close()
+    except Exception as error:
+        logger.warning('resolved links cache unavailable: %r', error)
+    return resolved
+
+
+def set_cached(resolved):
+    """Stores the resolved urls of resolved for CRAWLER_RESOLV_CACHE_TTL"""
+    global _last_purge
+    now = time.time()
+    expires = now + conf.CRAWLER_RESOLV_CACHE_TTL
+    try:
+        with _cache_lock:
+            cache = _open_cache()
+            try:
+                for url, final_url in resolved.items():
+                    cache[url.encode('utf8')] \
+                            = ('%d %s' % (expires, final_url)).encode('utf8')
+                if now - _last_purge > CACHE_PURGE_INTERVAL:
+                    _last_purge = now
+                    _purge(cache, now)
+            finally:
+                cache.close()
+    except Exception as error:
+        logger.warning('resolved links cache unavailable: %r', error)
+
+
+def resolve_many(urls):
+    """Returns a dict mapping each of urls to the url it redirects to, an
+    url which couldn't be resolved is mapped to itself"""
+    urls = set(filter(None, urls))
+    resolved = get_cached(urls)
+    to_resolve = list(urls.difference(resolved))
+    if to_resolve:
+        logger.debug('resolving %d links', len(to_resolve))
+        found = dict(zip(to_resolve, get_executor().map(resolve, to_resolve)))
+        set_cached({url: final_url for url, final_url in found.items()
+                    if final_url})
+        resolved.update(found)
+    return {url: resolved.get(url) or url for url in urls}
+
+
+def shutdown(wait=True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -1,6 +1,7 @@
 import os
 import json
 import random
+import tempfile
 import logging
 from os.path import abspath, join, dirname
 
@@ -44,8 +45,26 @@ SECTIONS = (
             {'key': 'PASSWD', 'default': 'admin'},
             {'key': 'NBWORKER', 'type': int, 'default': 2, 'test': 1},
             {'key': 'TYPE', 'default': 'http', 'edit': False},
+            {'key': 'ENGINE', 'default': 'thread', 'edit': False,
+             'choices': ('thread', 'asyncio')},
+            {'key': 'BACKEND', 'default': 'api', 'edit': False,
+             'choices': ('api', 'db')},
+            {'key': 'CONCURRENCY', 'type': int, 'default': 200,
+             'edit': False},
+            {'key': 'HOST_CONCURRENCY', 'type': int, 'default': 4,
+             'edit': False},
+            {'key': 'TIMEOUT', 'type': int, 'default': 30, 'edit': False},
+            {'key': 'PARSE_WORKERS', 'type': int, 'default': 0,
+             'edit': False},
             {'key': 'RESOLV', 'type': bool, 'default': False,
              'choices': ABS_CHOICES, 'edit': False},
+            {'key': 'RESOLV_WORKERS', 'type': int, 'default': 8,
+             'edit': False},
+            {'key': 'RESOLV_CACHE', 'default': join(ROOT, 'resolved_links'),
+             'test': join(tempfile.gettempdir(), 'jarr-test-resolved-links'),
+             'edit': False},
+            {'key': 'RESOLV_CACHE_TTL', 'type': int,
+             'default': 7 * 24 * 3600, 'edit': False},
             {'key': 'USER_AGENT',
              'edit': False, 'default': 'https://github.com/jaesivsm/JARR'},
         ]},
@@ -103,10 +122,26 @@ SECTIONS = (
              'type': int, 'default': 3, 'edit': False},
             {'key': 'REFRESH_RATE',
              'default': 60, 'type': int, 'edit': False},
+            {'key': 'MIN_REFRESH_RATE',
+             'default': 5, 'type': int, 'edit': False},
+            {'key': 'MAX_REFRESH_RATE',
+             'default': 1440, 'type': int, 'edit': False},
+            {'key': 'METADATA_REFRESH_RATE',
+             'default': 10080, 'type': int, 'edit': False},
         ]},
         {'prefix': 'WEBSERVER', 'edit': False, 'options': [
             {'key': 'HOST', 'default': '0.0.0.0', 'edit': False},
             {'key': 'PORT', 'default': 5000, 'type': int, 'edit': False},
+            {'key': 'X_SENDFILE', 'type': bool, 'default': False,
+             'choices': ABS_CHOICES, 'edit': False},
+        ]},
+        {'prefix': 'ICON', 'edit': False, 'options': [
+            {'key': 'STORE_PATH', 'default': join(ROOT, 'icons'),
+             'test': join(tempfile.gettempdir(), 'jarr-test-icons')},
+            {'key': 'FETCH_WORKERS', 'type': int, 'default': 2},
+            {'key': 'FETCH_TIMEOUT', 'type': int, 'default': 10},
+            {'key': 'MAX_SIZE', 'type': int, 'default': 256 * 1024},
+            {'key': 'RETRY_DELAY', 'type': int, 'default': 24 * 3600},
         ]},
 )
 
@@ -33,14 +33,44 @@ def db_create(login='admin', password='admin'):
         UserController(ignore_context=True).create(**admin)
 
 
+def _get_scheduler(engine, backend):
+    if backend == 'db' and engine == 'asyncio':
+        from crawler.db_crawler import AioCrawlerScheduler as CrawlerScheduler
+    elif backend == 'db':
+        from crawler.db_crawler import CrawlerScheduler
+    elif engine == 'asyncio':
+        from crawler.aio_crawler import CrawlerScheduler
+    else:
+        from crawler.http_crawler import CrawlerScheduler
+    return CrawlerScheduler(conf.CRAWLER_LOGIN, conf.CRAWLER_PASSWD)
+
+
 @manager.command
-def fetch(limit=100, retreive_all=False):
-    "Crawl the feeds with the client crawler."
-    from crawler.http_crawler import CrawlerScheduler
-    scheduler = CrawlerScheduler(conf.CRAWLER_LOGIN, conf.CRAWLER_PASSWD)
-    with scheduler.pool:
+def fetch(limit=100, retreive_all=False, engine=conf.CRAWLER_ENGINE,
+          backend=conf.CRAWLER_BACKEND):
+    """Crawl the feeds with the client crawler (thread or asyncio engine),
+    talking to jarr through its API or directly to the database (db)."""
+    scheduler = _get_scheduler(engine, backend)
+    try:
         scheduler.run(limit=limit, retreive_all=retreive_all)
         scheduler.wait()
+    finally:
+        scheduler.close()
+
+
+@manager.command
+def fetch_daemon(capacity=0, engine=conf.CRAWLER_ENGINE,
+                 backend=conf.CRAWLER_BACKEND):
+    "Crawl the feeds continuously, stops on SIGTERM."
+    scheduler = _get_scheduler(engine, backend)
+    if not capacity:
+        capacity = conf.CRAWLER_CONCURRENCY if engine == 'asyncio' \
+                else conf.CRAWLER_NBWORKER
+    try:
+        rate = scheduler.run_forever(capacity)
+    finally:
+        scheduler.close()
+    logger.info('crawler stopped, %.2f feeds/s overall', rate)
 
 
 @manager.command
@@ -52,7 +82,22 @@ def reset_feeds():
             .order_by(contr._db_cls.last_retrieved)):
         contr.update({'id': feed.id},
                 {'etag': '', 'last_modified': '',
-                 'last_retrieved': now - i * step})
+                 'last_retrieved': now - i * step,
+                 'next_retrieval': now + i * step})
+
+
+@manager.command
+def reconcile_counters(user_id=None):
+    "Recompute the unread and total counters of feeds and categories."
+    FeedController(user_id).reconcile_counters()
+
+
+@manager.command
+def reindex():
+    "Rebuild the full text index of the articles."
+    with application.app_context():
+        with db.engine.begin() as connection:
+            web.models.full_text.reindex(connection)
 
 
 @manager.command
@@ -61,7 +106,6 @@ def fetch_asyncio(user_id, feed_id):
     import asyncio
 
     with application.app_context():
-        from flask.ext.login import current_user
         from crawler import classic_crawler
         ucontr = UserController()
         users = []
@@ -82,7 +126,7 @@ def fetch_asyncio(user_id, feed_id):
         for user in users:
             if user.is_active:
                 logger.warn("Fetching articles for " + user.login)
-                classic_crawler.retrieve_feed(loop, current_user, feed_id)
+                classic_crawler.retrieve_feed(loop, user, feed_id)
         loop.close()
 
 
@@ -0,0 +1,35 @@
+"""scheduling feed retrieval
+
+Revision ID: 5f2bdb6f2a8e
+Revises: 9e3fecc9d031
+Create Date: 2016-05-08 17:42:03.516322
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5f2bdb6f2a8e'
+down_revision = '9e3fecc9d031'
+branch_labels = None
+depends_on = None
+
+from bootstrap import conf
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import table, column
+
+
+def upgrade():
+    op.add_column('feed',
+            sa.Column('next_retrieval', sa.DateTime(), nullable=True))
+    feed = table('feed',
+                 column('last_retrieved', sa.DateTime),
+                 column('next_retrieval', sa.DateTime))
+    op.execute(feed.update().values(
+            {'next_retrieval': feed.c['last_retrieved']}))
+    op.create_index('ix_feed_next_retrieval', 'feed', ['next_retrieval'])
+
+
+def downgrade():
+    op.drop_index('ix_feed_next_retrieval', 'feed')
+    if 'sqlite' not in conf.SQLALCHEMY_DATABASE_URI:
+        op.drop_column('feed', 'next_retrieval')
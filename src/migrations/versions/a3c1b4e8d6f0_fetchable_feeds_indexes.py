@@ -0,0 +1,29 @@
+"""indexes for the selection of fetchable feeds
+
+Revision ID: a3c1b4e8d6f0
+Revises: 5f2bdb6f2a8e
+Create Date: 2016-05-10 21:12:47.220931
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a3c1b4e8d6f0'
+down_revision = '5f2bdb6f2a8e'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+
+def upgrade():
+    op.drop_index('ix_feed_next_retrieval', 'feed')
+    op.create_index('idx_feed_fetchable', 'feed',
+                    ['enabled', 'next_retrieval'])
+    op.create_index('idx_article_fid_rdate', 'article',
+                    ['feed_id', 'retrieved_date'])
+
+
+def downgrade():
+    op.drop_index('idx_article_fid_rdate', 'article')
+    op.drop_index('idx_feed_fetchable', 'feed')
+    op.create_index('ix_feed_next_retrieval', 'feed', ['next_retrieval'])
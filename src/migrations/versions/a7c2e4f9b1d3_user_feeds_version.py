@@ -0,0 +1,28 @@
+"""adding a feeds version on users
+
+Revision ID: a7c2e4f9b1d3
+Revises: f6b1d4e8a2c5
+Create Date: 2016-05-22 18:12:41.540187
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2e4f9b1d3'
+down_revision = 'f6b1d4e8a2c5'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+from bootstrap import conf
+
+
+def upgrade():
+    op.add_column('user', sa.Column('feeds_version', sa.Integer(),
+                                    nullable=False, server_default='0'))
+
+
+def downgrade():
+    if 'sqlite' not in conf.SQLALCHEMY_DATABASE_URI:
+        op.drop_column('user', 'feeds_version')
@@ -0,0 +1,25 @@
+"""full text index on the title and the content of articles
+
+Revision ID: b8d3f5a1c9e4
+Revises: a7c2e4f9b1d3
+Create Date: 2016-05-24 21:05:18.327904
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f5a1c9e4'
+down_revision = 'a7c2e4f9b1d3'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+from web.models import full_text
+
+
+def upgrade():
+    full_text.reindex(op.get_bind())
+
+
+def downgrade():
+    full_text.drop(op.get_bind())
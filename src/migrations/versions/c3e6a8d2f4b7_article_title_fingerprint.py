@@ -0,0 +1,51 @@
+"""adding a fingerprint of the title on articles
+
+Revision ID: c3e6a8d2f4b7
+Revises: b8d3f5a1c9e4
+Create Date: 2016-05-27 20:41:33.058126
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3e6a8d2f4b7'
+down_revision = 'b8d3f5a1c9e4'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+from bootstrap import conf
+from web.lib.utils import title_fingerprint
+
+BATCH_SIZE = 10000
+
+
+def upgrade():
+    op.add_column('article', sa.Column('title_fingerprint', sa.String(32),
+                                       nullable=True))
+    bind = op.get_bind()
+    article = sa.table('article', sa.column('id', sa.Integer()),
+                       sa.column('title', sa.String()),
+                       sa.column('title_fingerprint', sa.String(32)))
+    update = article.update().where(article.c.id == sa.bindparam('_id'))\
+            .values(title_fingerprint=sa.bindparam('_fingerprint'))
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select([article.c.id, article.c.title])
+                .where(article.c.id > last_id).order_by(article.c.id)
+                .limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        bind.execute(update, [{'_id': article_id,
+                               '_fingerprint': title_fingerprint(title)}
+                              for article_id, title in rows])
+        last_id = rows[-1][0]
+    op.create_index('idx_article_fid_fingerprint', 'article',
+                    ['feed_id', 'title_fingerprint'])
+
+
+def downgrade():
+    op.drop_index('idx_article_fid_fingerprint', 'article')
+    if 'sqlite' not in conf.SQLALCHEMY_DATABASE_URI:
+        op.drop_column('article', 'title_fingerprint')
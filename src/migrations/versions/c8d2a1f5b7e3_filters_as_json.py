@@ -0,0 +1,55 @@
+"""storing feed filters as json
+
+Revision ID: c8d2a1f5b7e3
+Revises: a3c1b4e8d6f0
+Create Date: 2016-05-14 11:02:31.518306
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c8d2a1f5b7e3'
+down_revision = 'a3c1b4e8d6f0'
+branch_labels = None
+depends_on = None
+
+import json
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def _json_type():
+    if op.get_bind().dialect.name == 'postgresql':
+        return postgresql.JSONB(), lambda value: value, lambda value: value
+    return sa.Text(), json.dumps, json.loads
+
+
+def _convert(from_col, from_type, to_col, to_type, to_value):
+    """Copies from_col into the freshly added to_col, which then replaces
+    it, through to_value"""
+    bind = op.get_bind()
+    feed = sa.table('feed', sa.column('id', sa.Integer()),
+                    sa.column(from_col, from_type),
+                    sa.column(to_col, to_type))
+    for feed_id, value in bind.execute(
+            sa.select([feed.c.id, feed.c[from_col]])):
+        bind.execute(feed.update().where(feed.c.id == feed_id)
+                     .values(**{to_col: to_value(value)}))
+    with op.batch_alter_table('feed') as batch_op:
+        batch_op.drop_column(from_col)
+        batch_op.alter_column(to_col, new_column_name=from_col)
+
+
+def upgrade():
+    json_type, dump, _ = _json_type()
+    op.add_column('feed', sa.Column('filters_json', json_type, nullable=True))
+    _convert('filters', sa.PickleType(), 'filters_json', json_type,
+             lambda value: dump(value or []))
+
+
+def downgrade():
+    json_type, _, load = _json_type()
+    op.add_column('feed', sa.Column('filters_pickle', sa.PickleType(),
+                                    nullable=True))
+    _convert('filters', json_type, 'filters_pickle', sa.PickleType(),
+             lambda value: load(value) if value else [])
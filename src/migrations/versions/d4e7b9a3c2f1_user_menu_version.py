@@ -0,0 +1,28 @@
+"""adding a menu version on users
+
+Revision ID: d4e7b9a3c2f1
+Revises: c8d2a1f5b7e3
+Create Date: 2016-05-16 19:48:05.301278
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd4e7b9a3c2f1'
+down_revision = 'c8d2a1f5b7e3'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+from bootstrap import conf
+
+
+def upgrade():
+    op.add_column('user', sa.Column('menu_version', sa.Integer(),
+                                    nullable=False, server_default='0'))
+
+
+def downgrade():
+    if 'sqlite' not in conf.SQLALCHEMY_DATABASE_URI:
+        op.drop_column('user', 'menu_version')
@@ -0,0 +1,50 @@
+"""moving the content of icons to the file store
+
+Revision ID: d9f1b3e5a7c2
+Revises: c3e6a8d2f4b7
+Create Date: 2016-05-30 19:22:04.716385
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd9f1b3e5a7c2'
+down_revision = 'c3e6a8d2f4b7'
+branch_labels = None
+depends_on = None
+
+import base64
+from alembic import op
+import sqlalchemy as sa
+
+from web.lib import icon_store
+
+icon = sa.table('icon', sa.column('url', sa.String()),
+                sa.column('content', sa.String()),
+                sa.column('digest', sa.String(64)))
+
+
+def upgrade():
+    op.add_column('icon', sa.Column('digest', sa.String(64), nullable=True))
+    bind = op.get_bind()
+    for url, content in bind.execute(sa.select([icon.c.url, icon.c.content])
+                                     .where(icon.c.content != None)):
+        digest = icon_store.store(base64.b64decode(content))
+        bind.execute(icon.update().where(icon.c.url == url)
+                     .values(digest=digest))
+    op.create_index('ix_icon_digest', 'icon', ['digest'])
+    with op.batch_alter_table('icon') as batch_op:
+        batch_op.drop_column('content')
+
+
+def downgrade():
+    op.add_column('icon', sa.Column('content', sa.String(), nullable=True))
+    bind = op.get_bind()
+    for url, digest in bind.execute(sa.select([icon.c.url, icon.c.digest])
+                                    .where(icon.c.digest != None)):
+        if icon_store.exists(digest):
+            content = base64.b64encode(icon_store.load(digest))
+            bind.execute(icon.update().where(icon.c.url == url)
+                         .values(content=content.decode('utf8')))
+    op.drop_index('ix_icon_digest', 'icon')
+    with op.batch_alter_table('icon') as batch_op:
+        batch_op.drop_column('digest')
@@ -0,0 +1,32 @@
+"""keeping track of what the metadata of feeds were built from
+
+Revision ID: e2a4c6f8b1d9
+Revises: d9f1b3e5a7c2
+Create Date: 2016-06-02 20:14:37.512903
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e2a4c6f8b1d9'
+down_revision = 'd9f1b3e5a7c2'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+from bootstrap import conf
+
+
+def upgrade():
+    op.add_column('feed', sa.Column('metadata_hash', sa.String(),
+                                    nullable=True, server_default=''))
+    op.add_column('feed', sa.Column('metadata_refreshed', sa.DateTime(),
+                                    nullable=True,
+                                    server_default='1970-01-01 00:00:00'))
+
+
+def downgrade():
+    if 'sqlite' not in conf.SQLALCHEMY_DATABASE_URI:
+        op.drop_column('feed', 'metadata_refreshed')
+        op.drop_column('feed', 'metadata_hash')
@@ -0,0 +1,47 @@
+"""denormalized unread and total counters on feeds and categories
+
+Revision ID: e5a9c3d7f1b2
+Revises: d4e7b9a3c2f1
+Create Date: 2016-05-18 22:15:40.771204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c3d7f1b2'
+down_revision = 'd4e7b9a3c2f1'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+from bootstrap import conf
+
+
+def upgrade():
+    article = sa.table('article', sa.column('id', sa.Integer()),
+                       sa.column('feed_id', sa.Integer()),
+                       sa.column('category_id', sa.Integer()),
+                       sa.column('readed', sa.Boolean()))
+    for table_name, column in (('feed', article.c.feed_id),
+                               ('category', article.c.category_id)):
+        op.add_column(table_name, sa.Column('unread_count', sa.Integer(),
+                                            nullable=False, server_default='0'))
+        op.add_column(table_name, sa.Column('article_count', sa.Integer(),
+                                            nullable=False, server_default='0'))
+        table = sa.table(table_name, sa.column('id', sa.Integer()),
+                         sa.column('unread_count', sa.Integer()),
+                         sa.column('article_count', sa.Integer()))
+        op.execute(table.update().values(
+                unread_count=sa.select([sa.func.count(article.c.id)]).where(
+                    sa.and_(column == table.c.id,
+                            article.c.readed == False)).as_scalar(),
+                article_count=sa.select([sa.func.count(article.c.id)])
+                    .where(column == table.c.id).as_scalar()))
+
+
+def downgrade():
+    if 'sqlite' not in conf.SQLALCHEMY_DATABASE_URI:
+        for table_name in 'feed', 'category':
+            op.drop_column(table_name, 'unread_count')
+            op.drop_column(table_name, 'article_count')
@@ -0,0 +1,29 @@
+"""dating the retrievals of icons so that failed ones are retried
+
+Revision ID: f3b5d7a9c1e8
+Revises: e2a4c6f8b1d9
+Create Date: 2016-06-04 18:41:12.903127
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f3b5d7a9c1e8'
+down_revision = 'e2a4c6f8b1d9'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+from bootstrap import conf
+
+
+def upgrade():
+    # left empty on existing icons, those lacking content are retried
+    op.add_column('icon', sa.Column('last_attempt', sa.DateTime(),
+                                    nullable=True))
+
+
+def downgrade():
+    if 'sqlite' not in conf.SQLALCHEMY_DATABASE_URI:
+        op.drop_column('icon', 'last_attempt')
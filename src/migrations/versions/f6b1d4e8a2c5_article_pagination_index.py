@@ -0,0 +1,25 @@
+"""index for the keyset pagination of articles
+
+Revision ID: f6b1d4e8a2c5
+Revises: e5a9c3d7f1b2
+Create Date: 2016-05-21 10:37:12.604127
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f6b1d4e8a2c5'
+down_revision = 'e5a9c3d7f1b2'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index('idx_article_uid_date_id', 'article',
+                    ['user_id', sa.text('date DESC'), 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_article_uid_date_id', 'article')
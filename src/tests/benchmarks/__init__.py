@@ -0,0 +1,46 @@
+"""Benchmarks are regular test cases that'll only run if JARR_BENCHMARK is
+set to "true". Run them without output capture to see the timings:
+
+    JARR_BENCHMARK=true nosetests -s src/tests/benchmarks/
+"""
+import os
+import time
+import unittest
+from contextlib import contextmanager
+
+from bootstrap import db
+from web.models import Article
+
+BENCHMARK = os.environ.get('JARR_BENCHMARK') == 'true'
+
+
+def benchmark(cls):
+    return unittest.skipUnless(BENCHMARK,
+            'set JARR_BENCHMARK=true to run benchmarks')(cls)
+
+
+class BenchmarkMixin:
+
+    @contextmanager
+    def timed(self, label, count=None):
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        if count:
+            print('%-50s %10.2fms %12.1f/s'
+                  % (label, elapsed * 1000, count / elapsed))
+        else:
+            print('%-50s %10.2fms' % (label, elapsed * 1000))
+
+    @staticmethod
+    def bulk_articles(feed, count, prefix='bench'):
+        """Inserting count articles in feed, bypassing the controller"""
+        db.session.bulk_insert_mappings(Article, [
+                {'entry_id': '%s entry %d' % (prefix, i),
+                 'link': 'http://bench.te/%s/%d' % (prefix, i),
+                 'title': '%s title %d' % (prefix, i),
+                 'content': '%s content %d' % (prefix, i),
+                 'feed_id': feed.id, 'user_id': feed.user_id,
+                 'category_id': feed.category_id}
+                for i in range(count)])
+        db.session.commit()
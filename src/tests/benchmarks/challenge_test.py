@@ -0,0 +1,24 @@
+from tests.base import BaseJarrTest
+from tests.benchmarks import benchmark, BenchmarkMixin
+from web.controllers import ArticleController, FeedController
+
+
+@benchmark
+class ChallengeBenchmark(BaseJarrTest, BenchmarkMixin):
+
+    def test_challenge_vs_batch_challenge(self):
+        for size in (10, 100, 1000):
+            feed = FeedController().create(link='bench%d' % size, user_id=2,
+                                           title='bench %d' % size)
+            self.bulk_articles(feed, size // 2, prefix='size%d' % size)
+            ids = []
+            for i in range(size):
+                ids.append({'entry_id': 'size%d entry %d' % (size, i),
+                            'feed_id': feed.id, 'user_id': feed.user_id})
+            acontr = ArticleController()
+            with self.timed('challenge %d ids' % size, size):
+                missing = list(acontr.challenge(ids))
+            with self.timed('batch_challenge %d ids' % size, size):
+                batch_missing = acontr.batch_challenge(ids)
+            self.assertEquals(missing, batch_missing)
+            self.assertEquals(size - size // 2, len(missing))
@@ -0,0 +1,69 @@
+import os
+from datetime import datetime, timedelta
+
+from bootstrap import db
+from tests.base import BaseJarrTest
+from tests.benchmarks import benchmark, BenchmarkMixin
+from web.controllers import FeedController, ArticleController
+from web.models import Feed, Article, User
+
+# the reference setting is 100000 feeds and 10000000 articles,
+# defaults are kept low enough for an in memory sqlite
+FEEDS = int(os.environ.get('JARR_BENCHMARK_FEEDS', 10000))
+ARTICLES = int(os.environ.get('JARR_BENCHMARK_ARTICLES', 200000))
+
+
+@benchmark
+class FetchableBenchmark(BaseJarrTest, BenchmarkMixin):
+
+    def setUp(self):
+        super().setUp()
+        now = datetime.utcnow()
+        with self.timed('inserting %d feeds' % FEEDS, FEEDS):
+            db.session.bulk_insert_mappings(Feed, [
+                    {'link': 'bench%d' % i, 'title': 'bench%d' % i,
+                     'user_id': 2 + i % 2, 'enabled': True, 'error_count': 0,
+                     'last_retrieved': now - timedelta(minutes=i % 120),
+                     'next_retrieval': now + timedelta(minutes=i % 120 - 60)}
+                    for i in range(FEEDS)])
+            db.session.commit()
+        feed_ids = [row[0] for row in db.session.query(Feed.id)]
+        with self.timed('inserting %d articles' % ARTICLES, ARTICLES):
+            for offset in range(0, ARTICLES, 10000):
+                db.session.bulk_insert_mappings(Article, [
+                        {'entry_id': 'bench %d' % i, 'title': 'bench',
+                         'feed_id': feed_ids[i % len(feed_ids)],
+                         'user_id': 2 + feed_ids[i % len(feed_ids)] % 2,
+                         'retrieved_date': now - timedelta(minutes=i % 10000)}
+                        for i in range(offset, min(offset + 10000, ARTICLES))])
+                db.session.commit()
+
+    def _legacy_list_late(self, delta, limit):
+        """the selection as it was before the scheduling of retrievals"""
+        tenth = delta / 10
+        feed_last_retrieved = datetime.utcnow() - delta
+        art_last_retr = datetime.utcnow() - (2 * tenth)
+        last_conn_max = datetime.utcnow() - timedelta(days=30)
+        min_wait = datetime.utcnow() - tenth
+        ac, fc = ArticleController(), FeedController()
+        new_art_feed = (ac.read(retrieved_date__gt=art_last_retr,
+                                retrieved_date__lt=min_wait)
+                          .with_entities(Article.feed_id).distinct())
+        return list(fc.read(error_count__lt=6, enabled=True,
+                            __or__=[{'last_retrieved__lt': feed_last_retrieved},
+                                    {'last_retrieved__lt': min_wait,
+                                     'id__in': new_art_feed}])
+                      .join(User).filter(User.is_active == True,
+                                         User.last_connection >= last_conn_max)
+                      .order_by(Feed.last_retrieved).limit(limit))
+
+    def test_fetchable_selection(self):
+        fcontr = FeedController()
+        for limit in (10, 100, 1000):
+            with self.timed('legacy list_late limit=%d' % limit, limit):
+                self._legacy_list_late(timedelta(minutes=60), limit)
+            with self.timed('list_late limit=%d' % limit, limit):
+                list(fcontr.list_late(limit=limit))
+            with self.timed('list_fetchable (claiming) limit=%d' % limit,
+                            limit):
+                fcontr.list_fetchable(limit=limit)
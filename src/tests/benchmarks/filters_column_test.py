@@ -0,0 +1,50 @@
+import json
+import sqlalchemy as sa
+
+from bootstrap import db
+from tests.base import BaseJarrTest
+from tests.benchmarks import benchmark, BenchmarkMixin
+from web.lib.utils import default_handler
+from web.models.types import JSONType
+
+FILTERS = [{'type': 'regex', 'pattern': '.*(python|rust)[0-9]+.*',
+            'action on': 'match', 'action': 'mark as favorite'},
+           {'type': 'simple match', 'pattern': 'sponsored',
+            'action on': 'match', 'action': 'mark as read'}]
+
+
+@benchmark
+class FiltersColumnBenchmark(BaseJarrTest, BenchmarkMixin):
+    """Loading and serializing a list of feeds which filters are stored as
+    pickles (as they used to be) or as json"""
+
+    def _bench(self, label, type_, size):
+        metadata = sa.MetaData()
+        table = sa.Table('bench_%s_feed' % label, metadata,
+                         sa.Column('id', sa.Integer(), primary_key=True),
+                         sa.Column('title', sa.String()),
+                         sa.Column('filters', type_))
+        metadata.create_all(db.engine)
+        try:
+            db.engine.execute(table.insert(), [
+                    {'title': 'feed %d' % i, 'filters': FILTERS}
+                    for i in range(size)])
+            with self.timed('%s filters, loading %d feeds' % (label, size),
+                            size):
+                rows = [dict(row) for row
+                        in db.engine.execute(sa.select([table]))]
+            with self.timed('%s filters, serializing %d feeds'
+                            % (label, size), size):
+                json.dumps(rows, default=default_handler)
+            with self.timed('%s filters, updating %d feeds' % (label, size),
+                            size):
+                db.engine.execute(table.update().values(filters=FILTERS))
+        finally:
+            metadata.drop_all(db.engine)
+        return rows
+
+    def test_pickle_vs_json(self):
+        for size in (1000, 10000, 100000):
+            pickled = self._bench('pickle', sa.PickleType(), size)
+            jsoned = self._bench('json', JSONType(), size)
+            self.assertEquals(pickled, jsoned)
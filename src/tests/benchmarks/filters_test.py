@@ -0,0 +1,50 @@
+import re
+from unittest import TestCase
+
+from tests.benchmarks import benchmark, BenchmarkMixin
+from web.lib.feed_filters import CompiledFilters
+
+FILTERS = [{'type': 'regex', 'pattern': '.*(python|rust|go)[0-9]+.*',
+            'action on': 'match', 'action': 'mark as favorite'},
+           {'type': 'simple match', 'pattern': 'sponsored',
+            'action on': 'match', 'action': 'mark as read'},
+           {'type': 'regex', 'pattern': '^\\[news\\]',
+            'action on': 'no match', 'action': 'mark as read'}]
+
+
+def uncompiled(filters, title):
+    """What ArticleController.create used to do for each article"""
+    attrs = {}
+    for filter_ in filters:
+        match = False
+        if filter_.get('type') == 'regex':
+            match = re.match(filter_['pattern'], title)
+        elif filter_.get('type') == 'simple match':
+            match = filter_['pattern'] in title
+        take_action = match and filter_.get('action on') == 'match' \
+                or not match and filter_.get('action on') == 'no match'
+        if not take_action:
+            continue
+        if filter_.get('action') == 'mark as read':
+            attrs['readed'] = True
+        elif filter_.get('action') == 'mark as favorite':
+            attrs['like'] = True
+    return attrs
+
+
+@benchmark
+class FiltersBenchmark(TestCase, BenchmarkMixin):
+
+    def test_filters_throughput(self):
+        for size in (100, 1000, 10000):
+            titles = ['[news] title %d python%d %s' % (i, i % 7,
+                      'sponsored' if i % 3 else '') for i in range(size)]
+            with self.timed('uncompiled filters %d titles' % size, size):
+                expected = [uncompiled(FILTERS, title) for title in titles]
+            with self.timed('compiled filters %d titles' % size, size):
+                compiled = CompiledFilters(FILTERS)
+                results = [compiled.apply(title) for title in titles]
+            with self.timed('batched filters %d titles' % size, size):
+                batched = CompiledFilters(FILTERS).apply_many(titles)
+            self.assertEquals(expected, results)
+            self.assertEquals(expected, batched)
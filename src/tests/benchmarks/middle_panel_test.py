@@ -0,0 +1,68 @@
+import os
+import calendar
+from datetime import datetime, timedelta
+
+import pytz
+from babel.dates import format_datetime, format_timedelta
+
+from bootstrap import db
+from tests.base import JarrFlaskCommon
+from tests.benchmarks import benchmark, BenchmarkMixin
+from web.models import Feed, Article
+from web.views import home
+
+FEEDS = int(os.environ.get('JARR_BENCHMARK_FEEDS', 1000))
+REQUESTS = 50
+
+
+@benchmark
+class MiddlePanelBenchmark(JarrFlaskCommon, BenchmarkMixin):
+    """Rendering a page of the middle panel for a user with a lot of feeds,
+    with the feeds metadata loaded on each request (as it used to be) or
+    read from the per user cache"""
+
+    def setUp(self):
+        super().setUp()
+        now = datetime.utcnow()
+        db.session.bulk_insert_mappings(Feed, [
+                {'link': 'bench%d' % i, 'title': 'bench%d' % i,
+                 'icon_url': 'http://bench.te/%d.ico' % i, 'user_id': 2}
+                for i in range(FEEDS)])
+        db.session.commit()
+        feed_ids = [row[0] for row in
+                    db.session.query(Feed.id).filter(Feed.user_id == 2)]
+        db.session.bulk_insert_mappings(Article, [
+                {'entry_id': 'bench %d' % i, 'title': 'bench %d' % i,
+                 'feed_id': feed_ids[i % len(feed_ids)], 'user_id': 2,
+                 'date': now - timedelta(minutes=i)}
+                for i in range(FEEDS)])
+        db.session.commit()
+        self.app.post('/login', data={'login': 'user1', 'password': 'user1'})
+
+    def tearDown(self):
+        self.app.get('/logout')
+
+    def test_middle_panel(self):
+        with self.timed('%d middle panels, feeds loaded each time'
+                        % REQUESTS, REQUESTS):
+            for _ in range(REQUESTS):
+                home._feeds_cache.clear()
+                self.assertEquals(200,
+                        self.app.get('/middle_panel').status_code)
+        with self.timed('%d middle panels, feeds cached' % REQUESTS,
+                        REQUESTS):
+            for _ in range(REQUESTS):
+                self.assertEquals(200,
+                        self.app.get('/middle_panel').status_code)
+
+    def test_dates(self):
+        now = datetime.now()
+        dates = [now - timedelta(minutes=i) for i in range(FEEDS)]
+        with self.timed('formatting %d dates with babel' % FEEDS, FEEDS):
+            for date in dates:
+                format_datetime(pytz.utc.localize(date), locale='en')
+                format_timedelta(date - now, threshold=1.1,
+                                 add_direction=True, locale='en')
+        with self.timed('converting %d dates to timestamps' % FEEDS, FEEDS):
+            for date in dates:
+                calendar.timegm(date.utctimetuple())
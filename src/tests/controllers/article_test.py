@@ -1,5 +1,8 @@
+from sqlalchemy import event
 from tests.base import BaseJarrTest
-from web.controllers import UserController, ArticleController, FeedController
+from bootstrap import db
+from web.controllers import UserController, ArticleController, \
+        FeedController, CategoryController
 
 
 class ArticleControllerTest(BaseJarrTest):
@@ -104,3 +107,202 @@ class ArticleControllerTest(BaseJarrTest):
         self.assertTrue(art7.like)
         self.assertFalse(art8.readed)
         self.assertTrue(art8.like)
+
+    def test_filters_cache_invalidation(self):
+        feed_ctr, art_ctr = FeedController(2), ArticleController(2)
+        feed_id = feed_ctr.read()[0].id
+
+        def create(entry_id):
+            return art_ctr.create(entry_id=entry_id, feed_id=feed_id,
+                                  title='garbage pattern garbage',
+                                  link=entry_id)
+        feed_ctr.update({'id': feed_id},
+                        {'filters': [{"type": "regex",
+                                      "pattern": ".*pattern.*",
+                                      "action on": "match",
+                                      "action": "mark as read"}]})
+        self.assertTrue(create('cache1').readed)
+        feed_ctr.update({'id': feed_id},
+                        {'filters': [{"type": "regex",
+                                      "pattern": ".*pattern.*",
+                                      "action on": "no match",
+                                      "action": "mark as read"}]})
+        self.assertFalse(create('cache2').readed)
+        feed_ctr.update({'id': feed_id}, {'filters': []})
+        self.assertFalse(create('cache3').readed)
+
+    def _assert_counters(self, obj, unread, total):
+        self.assertEquals((unread, total),
+                          (obj.unread_count, obj.article_count))
+
+    def test_counters(self):
+        fcontr, ccontr = FeedController(2), CategoryController(2)
+        acontr = ArticleController(2)
+        feed = fcontr.read(category_id__ne=None).first()
+        self._assert_counters(feed, 3, 3)
+        self._assert_counters(ccontr.get(id=feed.category_id), 3, 3)
+
+        article = acontr.create(feed_id=feed.id, entry_id='counted',
+                                link='counted', title='counted')
+        self._assert_counters(fcontr.get(id=feed.id), 4, 4)
+        acontr.update({'feed_id': feed.id}, {'readed': True})
+        self._assert_counters(fcontr.get(id=feed.id), 0, 4)
+        self._assert_counters(ccontr.get(id=feed.category_id), 0, 4)
+        acontr.update({'id': article.id}, {'readed': False})
+        acontr.delete(article.id)
+        self._assert_counters(fcontr.get(id=feed.id), 0, 3)
+
+        # moving the feed to no category at all
+        category_id = feed.category_id
+        fcontr.update({'id': feed.id}, {'category_id': None})
+        self._assert_counters(ccontr.get(id=category_id), 0, 0)
+        self._assert_counters(fcontr.get(id=feed.id), 0, 3)
+
+        acontr.create_many([{'feed_id': feed.id, 'entry_id': 'many%d' % i,
+                             'link': 'many%d' % i} for i in range(3)])
+        self._assert_counters(fcontr.get(id=feed.id), 3, 6)
+
+        FeedController().update({}, {'unread_count': 0, 'article_count': 0})
+        FeedController(2).reconcile_counters()
+        self._assert_counters(fcontr.get(id=feed.id), 3, 6)
+        self._assert_counters(FeedController().get(id=4), 0, 0)
+        FeedController().reconcile_counters()
+        self._assert_counters(FeedController().get(id=4), 3, 3)
+
+    def test_mark_as_read(self):
+        fcontr, acontr = FeedController(2), ArticleController(2)
+        feed = fcontr.read(category_id__ne=None).first()
+        article = acontr.read(feed_id=feed.id).first()
+        acontr.update({'id': article.id}, {'readed': True})
+
+        rows = acontr.mark_as_read(feed_id=feed.id)
+        self.assertEquals(2, len(rows))
+        self.assertFalse(article.id in [row[0] for row in rows])
+        self.assertEquals({(feed.id, feed.category_id, 2)},
+                          {row[1:] for row in rows})
+        self._assert_counters(fcontr.get(id=feed.id), 0, 3)
+        self._assert_counters(CategoryController(2).get(
+                id=feed.category_id), 0, 3)
+        self.assertEquals([], acontr.mark_as_read(feed_id=feed.id))
+        # other users' articles are left untouched
+        self.assertEquals(6, len(acontr.mark_as_read()))
+        self.assertEquals(9, ArticleController(3).read(readed=False).count())
+
+    def test_search_availability_looked_up_once(self):
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', _record)
+        try:
+            for _ in range(3):
+                ArticleController(2).search('article0')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _record)
+        self.assertTrue(len([statement for statement in statements
+                             if 'sqlite_master' in statement]) <= 1)
+
+    def test_search(self):
+        acontr = ArticleController(2)
+        articles, offset = acontr.search('article0')
+        self.assertEquals(3, len(articles))
+        self.assertEquals(None, offset)
+        self.assertEquals(1, len(acontr.search('feed1 article2')[0]))
+        self.assertEquals(0, len(acontr.search('content')[0]))
+        self.assertEquals(9, len(acontr.search('content',
+                                               ('title', 'content'))[0]))
+        self.assertEquals(0, len(ArticleController(3).search('user1')[0]))
+        self.assertEquals(0, len(acontr.search(' ')[0]))
+
+        articles, offset = acontr.search('user1', limit=4)
+        self.assertEquals(4, offset)
+        ids = [art.id for art in articles]
+        articles, offset = acontr.search('user1', offset=offset, limit=6)
+        self.assertEquals(None, offset)
+        self.assertEquals(9, len(set(ids + [art.id for art in articles])))
+
+        # the index follows the modifications of the articles
+        article = articles[0]
+        acontr.update({'id': article.id}, {'title': 'renamed'})
+        self.assertEquals([article.id],
+                          [art.id for art in acontr.search('renamed')[0]])
+        self.assertEquals(1, acontr.read(__search__=('renamed',
+                                                     ('title',))).count())
+        acontr.delete(article.id)
+        self.assertEquals([], acontr.search('renamed')[0])
+
+    def test_read_page(self):
+        acontr = ArticleController(2)
+        expected = [art.id for art in acontr.read_light()]
+        self.assertEquals(9, len(expected))
+        ids, cursor, pages = [], None, 0
+        while True:
+            articles, cursor = acontr.read_page(cursor, limit=2)
+            ids.extend(art.id for art in articles)
+            pages += 1
+            if cursor is None:
+                break
+        self.assertEquals(expected, ids)
+        self.assertEquals(5, pages)
+        articles, cursor = acontr.read_page(limit=9)
+        self.assertEquals(9, len(articles))
+        self.assertEquals(None, cursor)
+
+    def test_batch_challenge(self):
+        acontr = ArticleController(2)
+        known = [{'entry_id': art.entry_id, 'feed_id': art.feed_id}
+                 for art in acontr.read()]
+        known.extend({'link': art.link} for art in acontr.read())
+        unknown = [{'entry_id': 'unknown entry', 'feed_id': 1},
+                   {'link': 'http://test.te/unknown'},
+                   {'link': None},
+                   {'entry_id': known[0]['entry_id'], 'feed_id': 4}]
+        ids = unknown[:2] + known + unknown[2:]
+        self.assertEquals(unknown, acontr.batch_challenge(ids))
+        self.assertEquals(list(acontr.challenge(ids)),
+                          acontr.batch_challenge(ids, chunk_size=2))
+        # user 3 doesn't own those articles
+        self.assertEquals(len(ids),
+                          len(ArticleController(3).batch_challenge(ids)))
+
+    def test_create_many(self):
+        feed_ctr = FeedController(2)
+        feed = feed_ctr.read()[0]
+        feed_ctr.update({'id': feed.id},
+                        {'filters': [{"type": "simple match",
+                                      "pattern": "no see pattern",
+                                      "action on": "match",
+                                      "action": "mark as read"}]})
+        results = ArticleController(2).create_many([
+                {'entry_id': 'many1', 'feed_id': feed.id,
+                 'title': 'garbage no see pattern garbage', 'link': 'many1'},
+                {'entry_id': 'many2', 'feed_id': 4, 'link': 'many2'},
+                {'entry_id': 'many3', 'link': 'many3'},
+                {'entry_id': 'many4', 'feed_id': feed.id,
+                 'title': 'garbage see pattern garbage', 'link': 'many4'}])
+        self.assertEquals(4, len(results))
+        self.assertTrue(results[0].readed)
+        self.assertEquals(feed.category_id, results[0].category_id)
+        self.assertTrue(isinstance(results[1], Exception))
+        self.assertTrue(isinstance(results[2], AssertionError))
+        self.assertFalse(results[3].readed)
+        self.assertEquals(2, ArticleController(2).read(
+                entry_id__in=['many1', 'many2', 'many3', 'many4']).count())
+
+    def test_create_many_integrity_error(self):
+        feed = FeedController(2).read()[0]
+        unread, total = feed.unread_count, feed.article_count
+        existing = ArticleController(2).read(feed_id=feed.id).first()
+        count = ArticleController(2).read(feed_id=feed.id).count()
+        results = ArticleController(2).create_many([
+                {'entry_id': 'many1', 'feed_id': feed.id, 'link': 'many1'},
+                {'id': existing.id, 'entry_id': 'many2', 'feed_id': feed.id,
+                 'link': 'many2'},
+                {'entry_id': 'many3', 'feed_id': feed.id, 'link': 'many3'}])
+        self.assertEquals(['many1', 'many3'],
+                          [results[0].entry_id, results[2].entry_id])
+        self.assertTrue(isinstance(results[1], Exception))
+        self.assertEquals(count + 2,
+                          ArticleController(2).read(feed_id=feed.id).count())
+        self._assert_counters(FeedController(2).get(id=feed.id),
+                              unread + 2, total + 2)
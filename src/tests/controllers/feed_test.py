@@ -1,5 +1,11 @@
+from mock import patch
+from datetime import datetime, timedelta
+from werkzeug.exceptions import NotFound
 from tests.base import BaseJarrTest
-from web.controllers import UserController, FeedController, ArticleController
+from bootstrap import conf
+from web.controllers import UserController, FeedController, \
+                            ArticleController, IconController
+from web.lib import icon_fetcher, icon_store
 
 
 class FeedControllerTest(BaseJarrTest):
@@ -11,3 +17,115 @@ class FeedControllerTest(BaseJarrTest):
                 ArticleController().read(feed_id=feed['id']).count())
         self._test_controller_rights(feed,
                 UserController().get(id=feed['user_id']))
+
+    def test_list_fetchable_schedule(self):
+        fcontr = FeedController()
+        fcontr.update({'id': 2}, {'error_count': 2})
+        silent = fcontr.create(link='silent', user_id=2, title='silent')
+        UserController().update({}, {'last_connection': datetime.utcnow()})
+        before = datetime.utcnow()
+        fetched = fcontr.list_fetchable(limit=10)
+        self.assertEquals(7, len(fetched))
+        self.assertEquals([], fcontr.list_fetchable(limit=10))
+
+        def delay(feed_id):
+            return fcontr.get(id=feed_id).next_retrieval - before
+        active = timedelta(minutes=conf.FEED_REFRESH_RATE)
+        self.assertTrue(active <= delay(1) < active + timedelta(minutes=1))
+        self.assertTrue(4 * active <= delay(2))
+        self.assertTrue(timedelta(minutes=conf.FEED_MAX_REFRESH_RATE)
+                        <= delay(silent.id))
+        # forcing retrieval of feeds retrieved more than 0 minutes ago
+        self.assertEquals(7, len(fcontr.list_fetchable(limit=10,
+                                                       refresh_rate=0)))
+
+    def test_get_duplicates(self):
+        acontr = ArticleController(2)
+        feed = FeedController(2).read()[0]
+        self.assertEquals([], FeedController(2).get_duplicates(feed.id)[1])
+        original = acontr.read(feed_id=feed.id).first()
+        now = datetime.utcnow()
+        acontr.create(feed_id=feed.id, entry_id='dup', link='dup',
+                      title='  <b>%s</b> ' % original.title.upper(),
+                      date=original.date + timedelta(hours=2),
+                      retrieved_date=now + timedelta(hours=1))
+        # same title, too far apart
+        acontr.create(feed_id=feed.id, entry_id='old', link='old',
+                      title=original.title,
+                      date=original.date - timedelta(days=2))
+
+        feed, duplicates = FeedController(2).get_duplicates(feed.id)
+        self.assertEquals(1, len(duplicates))
+        self.assertEquals(original.id, duplicates[0][0].id)
+        self.assertEquals('dup',
+                acontr.get(id=duplicates[0][1].id).entry_id)
+        self.assertRaises(NotFound, FeedController(3).get_duplicates, feed.id)
+
+    def test_get_inactives(self):
+        self.assertEquals([], FeedController(2).get_inactives(5))
+        feed = FeedController(2).read()[0]
+        ArticleController().update({'feed_id': feed.id},
+                {'date': datetime.utcnow() - timedelta(days=10)})
+        ArticleController().update({'user_id': 3},
+                {'date': datetime.utcnow() - timedelta(days=20)})
+
+        inactives = FeedController(2).get_inactives(5)
+        self.assertEquals([feed.id], [feed.id for feed, _ in inactives])
+        self.assertEquals(10, inactives[0][1].days)
+        self.assertEquals([], FeedController(2).get_inactives(15))
+        self.assertEquals(3, len(FeedController(3).get_inactives(15)))
+        self.assertEquals(4, len(FeedController().get_inactives(5)))
+
+    @patch('web.lib.icon_fetcher.download')
+    @patch('web.lib.icon_fetcher.schedule')
+    def test_icon_retrieved_in_background(self, schedule, download):
+        download.return_value = b'icon', 'image/png'
+        url = 'http://te.st/favicon.ico'
+        for feed_id in (1, 2):
+            FeedController(2).update({'id': feed_id}, {'icon_url': url})
+        schedule.assert_called_once_with(url)
+        self.assertEquals(None, IconController().get(url=url).digest)
+
+        version = UserController().get(id=2).feeds_version
+        icon_fetcher.fetch(url)
+        download.assert_called_once_with(url)
+        self.assertEquals(icon_store.get_digest(b'icon'),
+                          IconController().get(url=url).digest)
+        self.assertEquals(version + 1,
+                          UserController().get(id=2).feeds_version)
+
+    @patch('web.lib.icon_fetcher.download')
+    @patch('web.lib.icon_fetcher.schedule')
+    def test_failed_icon_retried(self, schedule, download):
+        download.side_effect = ValueError('not an image')
+        url = 'http://te.st/favicon.ico'
+        FeedController(2).update({'id': 1}, {'icon_url': url})
+        created = IconController().get(url=url).last_attempt
+        icon_fetcher.fetch(url)
+        icon = IconController().get(url=url)
+        self.assertEquals(None, icon.digest)
+        self.assertTrue(icon.last_attempt >= created)
+
+        # failed too recently to be tried again
+        FeedController(2).update({'id': 2}, {'icon_url': url})
+        self.assertEquals(1, schedule.call_count)
+        IconController().update({'url': url}, {'last_attempt':
+                datetime.utcnow() - timedelta(seconds=conf.ICON_RETRY_DELAY)})
+        FeedController(2).update({'id': 3}, {'icon_url': url})
+        self.assertEquals(2, schedule.call_count)
+        schedule.assert_called_with(url)
+
+        download.side_effect = None
+        download.return_value = b'icon', 'image/png'
+        icon_fetcher.fetch(url)
+        self.assertEquals(icon_store.get_digest(b'icon'),
+                          IconController().get(url=url).digest)
+
+    def test_list_fetchable_claims_once(self):
+        fcontr = FeedController()
+        late = list(fcontr.list_late(limit=10))
+        self.assertEquals(6, len(fcontr.list_fetchable(limit=10)))
+        # another crawler having selected the same feeds beforehand
+        with patch.object(FeedController, 'list_late',
+                          return_value=iter(late)):
+            self.assertEquals([], fcontr.list_fetchable(limit=10))
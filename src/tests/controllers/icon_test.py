@@ -0,0 +1,46 @@
+from mock import patch
+from werkzeug.exceptions import NotFound
+from tests.base import BaseJarrTest
+from web.controllers import IconController
+from web.lib import icon_fetcher, icon_store
+
+
+class IconControllerTest(BaseJarrTest):
+    _contr_cls = IconController
+
+    @patch('web.lib.icon_fetcher.schedule')
+    def test_create_delete(self, schedule):
+        icon_contr = IconController()
+        url = 'http://te.st/icon.ico'
+        icon = icon_contr.create(url=url, mimetype='image/png',
+                                 content=b'png')
+        digest = icon.digest
+        self.assertEquals(icon_store.get_digest(b'png'), digest)
+        self.assertFalse(schedule.called)
+        empty = icon_contr.create(url='http://te.st/empty.ico')
+        self.assertEquals(None, empty.digest)
+        schedule.assert_called_once_with('http://te.st/empty.ico')
+
+        icon_contr.delete(url)
+        self.assertRaises(NotFound, icon_contr.get, url=url)
+        # the content is kept for the other icons that may share it
+        self.assertTrue(icon_store.exists(digest))
+
+    @patch('web.lib.icon_fetcher.download')
+    @patch('web.lib.icon_fetcher.get_executor')
+    def test_fetch_scheduled_once(self, get_executor, download):
+        download.return_value = b'icon', 'image/png'
+        url = 'http://te.st/favicon.ico'
+        IconController().create(url=url)
+        submit = get_executor.return_value.submit
+        submit.assert_called_once_with(icon_fetcher.fetch, url)
+        # already pending
+        self.assertFalse(icon_fetcher.schedule(url))
+        self.assertEquals(1, submit.call_count)
+
+        icon_fetcher.fetch(url)
+        self.assertEquals(icon_store.get_digest(b'icon'),
+                          IconController().get(url=url).digest)
+        self.assertTrue(icon_fetcher.schedule(url))
+        self.assertEquals(2, submit.call_count)
+        icon_fetcher.fetch(url)
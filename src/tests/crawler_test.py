@@ -1,15 +1,31 @@
 from tests.base import JarrFlaskCommon
+import os
+import dbm
+import re
+import pickle
+import tempfile
 import logging
+import unittest
 from mock import Mock, patch
 from datetime import datetime
+from sqlalchemy import event
 
-from bootstrap import conf
+from bootstrap import conf, db
 from crawler.http_crawler import CrawlerScheduler
-from web.controllers import UserController, FeedController
+from crawler.aio_crawler import CrawlerScheduler as AioCrawlerScheduler
+from crawler.db_crawler import CrawlerScheduler as DbCrawlerScheduler, \
+        create_articles
+from crawler.lib import feed_parsing, link_resolving
+from crawler.classic_crawler import match_entries, save_entries
+from crawler.lib.article_utils import construct_articles
+from web.lib.feed_utils import construct_feed_from
+from web.controllers import UserController, FeedController, \
+        ArticleController
 logger = logging.getLogger('web')
 
 
 class CrawlerTest(JarrFlaskCommon):
+    scheduler_cls = CrawlerScheduler
 
     def setUp(self):
         super().setUp()
@@ -69,6 +85,8 @@ class CrawlerTest(JarrFlaskCommon):
     def _reset_feeds_freshness(self, **kwargs):
         if 'last_retrieved' not in kwargs:
             kwargs['last_retrieved'] = datetime(1970, 1, 1)
+        if 'next_retrieval' not in kwargs:
+            kwargs['next_retrieval'] = datetime(1970, 1, 1)
         if 'etag' not in kwargs:
             kwargs['etag'] = ''
         if 'last_modified' not in kwargs:
@@ -76,12 +94,13 @@ class CrawlerTest(JarrFlaskCommon):
         FeedController().update({}, kwargs)
 
     def test_http_crawler_add_articles(self):
-        scheduler = CrawlerScheduler('admin', 'admin')
+        scheduler = self.scheduler_cls('admin', 'admin')
         resp = self._api('get', 'articles', data={'limit': 1000}, user='admin')
         self.assertEquals(18, len(resp.json()))
 
         scheduler.run()
-        scheduler.wait()
+        self.assertTrue(scheduler.wait())
+        self.assertEquals(0, sum(scheduler.in_flight().values()))
         resp = self._api('get', 'articles', data={'limit': 1000}, user='admin')
         self.assertEquals(143, len(resp.json()))
 
@@ -95,8 +114,39 @@ class CrawlerTest(JarrFlaskCommon):
         resp = self._api('get', 'articles', data={'limit': 1000}, user='admin')
         self.assertEquals(143, len(resp.json()))
 
+    def test_daemon(self):
+        scheduler = self.scheduler_cls('admin', 'admin')
+        idle = scheduler.idle
+
+        def _idle(timeout):
+            idle(timeout)
+            if not scheduler.polling:  # stopping after the first round
+                scheduler.stop()
+        scheduler.idle = _idle
+        self.assertTrue(scheduler.run_forever(10) >= 0)
+        self.assertEquals(0, sum(scheduler.in_flight().values()))
+        resp = self._api('get', 'articles', data={'limit': 1000}, user='admin')
+        self.assertEquals(143, len(resp.json()))
+
+    def test_metadata_refreshed_on_change_only(self):
+        scheduler = self.scheduler_cls('admin', 'admin')
+        scheduler.run()
+        scheduler.wait()
+        refreshed = self.jarr_con.call_count
+        self.assertTrue(refreshed > 0)
+
+        self._reset_feeds_freshness()
+        scheduler.run()
+        scheduler.wait()
+        self.assertEquals(refreshed, self.jarr_con.call_count)
+
+        self._reset_feeds_freshness(metadata_refreshed=datetime(1970, 1, 1))
+        scheduler.run()
+        scheduler.wait()
+        self.assertEquals(2 * refreshed, self.jarr_con.call_count)
+
     def test_no_add_on_304(self):
-        scheduler = CrawlerScheduler('admin', 'admin')
+        scheduler = self.scheduler_cls('admin', 'admin')
         self.resp_status_code = 304
         resp = self._api('get', 'articles', data={'limit': 1000}, user='admin')
         self.assertEquals(18, len(resp.json()))
@@ -111,7 +161,7 @@ class CrawlerTest(JarrFlaskCommon):
         self.resp_headers = {'etag': 'fake etag'}
         resp = self._api('get', 'articles', data={'limit': 1000}, user='admin')
         self.assertEquals(18, len(resp.json()))
-        scheduler = CrawlerScheduler('admin', 'admin')
+        scheduler = self.scheduler_cls('admin', 'admin')
 
         scheduler.run()
         scheduler.wait()
@@ -133,3 +183,196 @@ class CrawlerTest(JarrFlaskCommon):
         scheduler.wait()
         resp = self._api('get', 'articles', data={'limit': 1000}, user='admin')
         self.assertEquals(143, len(resp.json()))
+
+
+class AioCrawlerTest(CrawlerTest):
+    scheduler_cls = AioCrawlerScheduler
+
+    def setUp(self):
+        super().setUp()
+
+        async def _fetch(crawler, method, url, **kwargs):
+            return self.jarr_req.side_effect(method, url, **kwargs)
+        self._p_fetch = patch('crawler.aio_crawler.AioCrawler._fetch',
+                              new=_fetch)
+        self._p_fetch.start()
+
+    def tearDown(self):
+        super().tearDown()
+        self._p_fetch.stop()
+
+
+class DbCrawlerTest(CrawlerTest):
+    scheduler_cls = DbCrawlerScheduler
+
+    def test_created_articles_not_reloaded(self):
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', _record)
+        try:
+            articles, status = create_articles([{'feed_id': 1, 'user_id': 2,
+                    'entry_id': 'db%d' % i, 'link': 'db%d' % i}
+                    for i in range(5)])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _record)
+        self.assertEquals(200, status)
+        self.assertEquals(['db%d' % i for i in range(5)],
+                          [article['entry_id'] for article in articles])
+        reloads = [statement for statement in statements
+                   if re.search(r'FROM article\s+WHERE', statement)]
+        self.assertEquals([], reloads)
+
+
+class FeedParsingTest(unittest.TestCase):
+
+    def test_parse(self):
+        with open('src/tests/fixtures/example.feed.atom') as fd:
+            content = fd.read()
+        parsed = feed_parsing.submit(content).result()
+        self.assertFalse(parsed['bozo'])
+        self.assertTrue(parsed['feed']['title'])
+        self.assertTrue(parsed['entries'])
+        for entry in parsed['entries']:
+            self.assertTrue(entry['link'])
+        self.assertEquals(parsed, pickle.loads(pickle.dumps(parsed)))
+
+
+class SiteDiscoveryTest(unittest.TestCase):
+    page = b'''<html><head><title>Site</title>
+        <link rel="shortcut icon" href="/icon.png" />
+        <link rel="alternate" type="application/atom+xml" href="/feed" />
+        </head><body></body></html>'''
+
+    @patch('requests.get')
+    def test_site_queried_once(self, get):
+        def _get(url, **kwargs):
+            response = Mock(url=url, ok=url.endswith('/icon.png'),
+                            content=self.page,
+                            headers={'content-type': 'text/html'})
+            if response.ok:
+                response.headers = {'content-type': 'image/png'}
+                response.iter_content.return_value = iter([b'png'])
+            return response
+        get.side_effect = _get
+        parsed = {'bozo': False, 'entries': [{}],
+                  'feed': {'link': 'http://discovery.te/'}}
+
+        for _ in range(2):
+            feed = construct_feed_from('http://discovery.te/feed', parsed)
+            self.assertEquals('Site', feed['title'])
+            self.assertEquals('http://discovery.te/icon.png',
+                              feed['icon_url'])
+        self.assertEquals(1, [call[0][0] for call in get.call_args_list]
+                             .count('http://discovery.te/'))
+
+
+class ClassicCrawlerTest(JarrFlaskCommon):
+
+    @staticmethod
+    def _save(feed, entries):
+        new_entries, known_entries = match_entries(feed['user_id'], feed,
+                                                   entries)
+        return save_entries(feed['user_id'], feed, known_entries,
+                            construct_articles(new_entries, feed),
+                            {'error_count': 0})
+
+    def test_save_entries(self):
+        with open('src/tests/fixtures/example.feed.atom') as fd:
+            entries = feed_parsing.parse(fd.read())['entries']
+        feed = FeedController().get(id=1).dump()
+        art_contr = ArticleController()
+        count = art_contr.read(feed_id=1).count()
+
+        created = self._save(feed, entries)
+        self.assertEquals(len(entries), len(created))
+        self.assertEquals(count + len(entries),
+                          art_contr.read(feed_id=1).count())
+
+        entries[0]['title'] = 'a brand new title'
+        self.assertEquals([], self._save(feed, entries))
+        self.assertEquals(count + len(entries),
+                          art_contr.read(feed_id=1).count())
+        self.assertEquals(1, art_contr.read(feed_id=1,
+                                            title='a brand new title').count())
+
+    @patch('crawler.lib.link_resolving.resolve_many')
+    def test_known_links_not_resolved(self, resolve_many):
+        resolve_many.side_effect = lambda urls: {url: url for url in urls}
+        with open('src/tests/fixtures/example.feed.atom') as fd:
+            entries = feed_parsing.parse(fd.read())['entries']
+        feed = FeedController().get(id=1).dump()
+        with patch.object(conf, 'CRAWLER_RESOLV', True):
+            self._save(feed, entries)
+            self.assertEquals(1, resolve_many.call_count)
+            self.assertEquals([], self._save(feed, entries))
+            # all the entries are known, none had its link resolved again
+            self.assertEquals(1, resolve_many.call_count)
+
+
+class LinkResolvingTest(unittest.TestCase):
+
+    def setUp(self):
+        self._p_cache = patch.object(conf, 'CRAWLER_RESOLV_CACHE',
+                os.path.join(tempfile.mkdtemp(), 'resolved_links'))
+        self._p_cache.start()
+
+    def tearDown(self):
+        link_resolving.shutdown()
+        self._p_cache.stop()
+
+    @patch('requests.request')
+    def test_resolve_many(self, request):
+        def _request(method, url, **kwargs):
+            if method == 'head' and 'nohead' in url:
+                return Mock(status_code=405, url=url)
+            if 'broken' in url:
+                raise ConnectionError()
+            return Mock(status_code=200, url=url.replace('proxy', 'site'))
+        request.side_effect = _request
+        urls = ['http://proxy.te/resolving/1', 'http://proxy.te/nohead/2',
+                'http://broken.te/resolving/3']
+
+        self.assertEquals({'http://proxy.te/resolving/1':
+                                'http://site.te/resolving/1',
+                           'http://proxy.te/nohead/2':
+                                'http://site.te/nohead/2',
+                           'http://broken.te/resolving/3':
+                                'http://broken.te/resolving/3'},
+                          link_resolving.resolve_many(urls))
+        self.assertEquals(4, request.call_count)
+        # resolved links are cached, only the broken one is retried
+        link_resolving.resolve_many(urls)
+        self.assertEquals(5, request.call_count)
+
+    @patch('requests.request')
+    def test_cache_expiry_and_failure(self, request):
+        request.return_value = Mock(status_code=200, url='http://site.te/1')
+        with patch.object(conf, 'CRAWLER_RESOLV_CACHE_TTL', -1):
+            link_resolving.resolve_many(['http://proxy.te/1'])
+            link_resolving.resolve_many(['http://proxy.te/1'])
+        self.assertEquals(2, request.call_count)
+
+        # an unusable cache is a cache miss, not an error
+        with patch('dbm.open', side_effect=OSError('locked')):
+            self.assertEquals({'http://proxy.te/1': 'http://site.te/1'},
+                    link_resolving.resolve_many(['http://proxy.te/1']))
+        self.assertEquals(3, request.call_count)
+
+    def test_expired_entries_deleted(self):
+        with patch.object(conf, 'CRAWLER_RESOLV_CACHE_TTL', -1):
+            link_resolving.set_cached(
+                    {'http://proxy.te/1': 'http://site.te/1',
+                     'http://proxy.te/2': 'http://site.te/2'})
+        link_resolving.set_cached({'http://proxy.te/3': 'http://site.te/3'})
+        self.assertEquals({}, link_resolving.get_cached(['http://proxy.te/1']))
+        with patch.object(link_resolving, '_last_purge', 0):
+            link_resolving.set_cached({'http://proxy.te/4':
+                                       'http://site.te/4'})
+        cache = dbm.open(conf.CRAWLER_RESOLV_CACHE)
+        try:
+            self.assertEquals([b'http://proxy.te/3', b'http://proxy.te/4'],
+                              sorted(cache.keys()))
+        finally:
+            cache.close()
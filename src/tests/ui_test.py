@@ -1,5 +1,6 @@
 import json
 from tests.base import JarrFlaskCommon
+from web.controllers import IconController
 
 
 class BaseUiTest(JarrFlaskCommon):
@@ -15,6 +16,22 @@ class BaseUiTest(JarrFlaskCommon):
         resp = self.app.get('/menu')
         self.assertEquals(200, resp.status_code)
 
+    def test_menu_cache(self):
+        resp = self.app.get('/menu')
+        etag = resp.headers['etag']
+        self.assertEquals(18 // 2,
+                json.loads(resp.data.decode('utf8'))['all_unread_count'])
+        resp = self.app.get('/menu', headers={'If-None-Match': etag})
+        self.assertEquals(304, resp.status_code)
+
+        resp = self.app.put('/mark_all_as_read', data='{}',
+                headers={'Content-Type': 'application/json'})
+        resp = self.app.get('/menu', headers={'If-None-Match': etag})
+        self.assertEquals(200, resp.status_code)
+        self.assertNotEquals(etag, resp.headers['etag'])
+        self.assertEquals(0,
+                json.loads(resp.data.decode('utf8'))['all_unread_count'])
+
     def test_middle_panel(self):
         resp = self.app.get('/middle_panel')
         self.assertEquals(200, resp.status_code)
@@ -33,6 +50,11 @@ class BaseUiTest(JarrFlaskCommon):
         resp = self.app.get('/middle_panel?query=test'
                             '&search_title=true&search_content=true')
         self.assertEquals(200, resp.status_code)
+        resp = self.app.get('/middle_panel?query=content'
+                            '&search_content=true&cursor=3')
+        self.assertEquals(200, resp.status_code)
+        self.assertEquals(6,
+                len(json.loads(resp.data.decode('utf8'))['articles']))
         resp = self.app.get('/middle_panel?filed_type=feed&filter_id=1')
         self.assertEquals(200, resp.status_code)
         resp = self.app.get('/middle_panel?filter_type=category&filter_id=0')
@@ -42,11 +64,68 @@ class BaseUiTest(JarrFlaskCommon):
         resp = self.app.put('/mark_all_as_read', data='{}',
                 headers={'Content-Type': 'application/json'})
         self.assertEquals(200, resp.status_code)
+        delta = json.loads(resp.data.decode('utf8'))
+        self.assertEquals(9, len(delta['articles']))
+        self.assertEquals(9, sum(delta['feeds'].values()))
+        self.assertEquals(9, sum(delta['categories'].values()))
         resp = self.app.get('/middle_panel?filter=unread')
         self.assertEquals(200, resp.status_code)
         self.assertEquals(0,
                 len(json.loads(resp.data.decode('utf8'))['articles']))
 
+    def test_middle_panel_feeds_cache(self):
+        resp = self.app.get('/middle_panel?filter_type=feed_id&filter_id=1')
+        articles = json.loads(resp.data.decode('utf8'))['articles']
+        self.assertTrue(all(isinstance(art['timestamp'], int)
+                            for art in articles))
+        self.assertNotEquals(['renamed'] * len(articles),
+                             [art['feed_title'] for art in articles])
+
+        resp = self._api('put', 'feed', 1, data={'title': 'renamed'},
+                         user='user1')
+        self.assertEquals(200, resp.status_code)
+        resp = self.app.get('/middle_panel?filter_type=feed_id&filter_id=1')
+        articles = json.loads(resp.data.decode('utf8'))['articles']
+        self.assertEquals(['renamed'] * len(articles),
+                          [art['feed_title'] for art in articles])
+
+    def test_middle_panel_pages(self):
+        resp = self.app.get('/middle_panel?filter=all')
+        self.assertEquals(None,
+                json.loads(resp.data.decode('utf8'))['next_page'])
+        resp = self.app.get('/middle_panel?cursor=2100-01-01T00:00:00;0')
+        self.assertEquals(9,
+                len(json.loads(resp.data.decode('utf8'))['articles']))
+        resp = self.app.get('/middle_panel?cursor=garbage')
+        self.assertEquals(400, resp.status_code)
+
+    def test_icon(self):
+        icon = IconController().create(url='http://te.st/icon.ico',
+                                       mimetype='image/png', content=b'png')
+        same = IconController().create(url='http://te.st/same.ico',
+                                       mimetype='image/png', content=b'png')
+        self.assertEquals(icon.digest, same.digest)
+        resp = self.app.get('/icon/?url=http://te.st/icon.ico')
+        self.assertEquals(302, resp.status_code)
+        self.assertTrue(resp.headers['Location'].endswith(
+                '/icon/%s' % icon.digest))
+
+        resp = self.app.get('/icon/%s' % icon.digest)
+        self.assertEquals(200, resp.status_code)
+        self.assertEquals(b'png', resp.data)
+        self.assertEquals('image/png', resp.headers['Content-Type'])
+        self.assertTrue('immutable' in resp.headers['Cache-Control'])
+        self.assertEquals('"%s"' % icon.digest, resp.headers['ETag'])
+        resp.close()
+        resp = self.app.get('/icon/%s' % icon.digest,
+                            headers={'If-None-Match': '"%s"' % icon.digest})
+        self.assertEquals(304, resp.status_code)
+        resp.close()
+        self.assertEquals(404, self.app.get(
+                '/icon/?url=http://te.st/unknown.ico').status_code)
+        self.assertEquals(404, self.app.get('/icon/%s' % ('0' * 64))
+                                       .status_code)
+
     def test_getart(self):
         resp = self.app.get('/getart/1',
                 headers={'Content-Type': 'application/json'})
@@ -6,12 +6,17 @@ from collections import defaultdict
 from sqlalchemy import and_, or_, func
 from werkzeug.exceptions import Forbidden, NotFound
 
+from web.models import User
+
 logger = logging.getLogger(__name__)
 
 
 class AbstractController:
     _db_cls = None  # reference to the database class
     _user_id_key = 'user_id'
+    # versions of the user, cached views depending on the objects of
+    # this controller are outdated once they're incremented
+    _bumped_versions = ()
 
     def __init__(self, user_id=None, ignore_context=False):
         """User id is a right management mechanism that should be used to
@@ -92,14 +97,28 @@ class AbstractController:
 
         obj = self._db_cls(**attrs)
         db.session.add(obj)
+        self._bump_versions(objs=[obj])
         db.session.commit()
         return obj
 
+    def create_many(self, attrs_list):
+        """Will create an object for each attrs dict, the result list will
+        hold either the created object or the error raised while creating
+        it"""
+        results = []
+        for attrs in attrs_list:
+            try:
+                results.append(self.create(**attrs))
+            except Exception as error:
+                results.append(error)
+        return results
+
     def read(self, **filters):
         return self._get(**filters)
 
     def update(self, filters, attrs):
         assert attrs, "attributes to update must not be empty"
+        self._bump_versions(filters=dict(filters))
         result = self._get(**filters).update(attrs, synchronize_session=False)
         db.session.commit()
         return result
@@ -107,9 +126,32 @@ class AbstractController:
     def delete(self, obj_id):
         obj = self.get(id=obj_id)
         db.session.delete(obj)
+        self._bump_versions(objs=[obj])
         db.session.commit()
         return obj
 
+    def _bump_versions(self, user_ids=None, filters=None, objs=None):
+        """Will increment, within the current transaction, the versions
+        (see _bumped_versions) of user_ids, of the owners of objs or, if
+        filters are given, of the owners of the objects matching them."""
+        if not self._bumped_versions or self._user_id_key is None:
+            return
+        if objs is not None:
+            user_ids = [getattr(obj, self._user_id_key, None) for obj in objs]
+        if filters is not None and self.user_id:
+            user_ids = [self.user_id]
+        elif filters is not None:
+            user_ids = self._get(**filters).with_entities(
+                    getattr(self._db_cls, self._user_id_key)).statement
+        else:
+            user_ids = [user_id for user_id in user_ids or [] if user_id]
+            if not user_ids:
+                return
+        User.query.filter(User.id.in_(user_ids)).update(
+                {getattr(User, version): getattr(User, version) + 1
+                 for version in self._bumped_versions},
+                synchronize_session=False)
+
     def _has_right_on(self, obj):
         # user_id == None is like being admin
         if self._user_id_key is None:
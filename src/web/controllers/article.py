@@ -1,20 +1,38 @@
-import re
 import logging
 import sqlalchemy
-from sqlalchemy import func
-from collections import Counter
+from sqlalchemy import func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
 
 from bootstrap import db
 from .abstract import AbstractController
 from web.controllers import CategoryController, FeedController
-from web.models import User, Article
+from web.models import User, Article, Feed, Category, full_text
+from web.lib.feed_filters import get_filters
+from web.lib.utils import title_fingerprint
 
 logger = logging.getLogger(__name__)
+# keeping IN clauses under sqlite's default limit of bound parameters
+CHALLENGE_CHUNK_SIZE = 500
+ARTICLES_PAGE_SIZE = 100
+# the fields of an article the feed and category counters depend on
+COUNTED_FIELDS = ('feed_id', 'category_id', 'readed')
 
 
 class ArticleController(AbstractController):
     _db_cls = Article
+    _bumped_versions = ('menu_version',)
+
+    def _to_filters(self, **filters):
+        """Handles, on top of the common filters, "__search__" which value
+        is a tuple of the terms to look for and the fields to look them in
+        and which is matched against the full text index"""
+        search = filters.pop('__search__', None)
+        db_filters = super()._to_filters(**filters)
+        if search is not None:
+            db_filters.add(full_text.match(db.engine, Article, *search))
+        return db_filters
 
     def challenge(self, ids):
         """Will return each id that wasn't found in the database."""
@@ -23,6 +41,47 @@ class ArticleController(AbstractController):
                 continue
             yield id_
 
+    def batch_challenge(self, ids, chunk_size=CHALLENGE_CHUNK_SIZE):
+        """Set based version of challenge.
+
+        Ids are grouped by shape (the set of keys they're made of, like
+        entry_id or link). Keys having the same value across a group are
+        used as plain filters, the others are matched with IN clauses
+        against chunks of the group. Returns the ids not found in the
+        database, in the order they were given.
+        """
+        ids = list(ids)
+        by_shape, found = defaultdict(list), set()
+        for id_ in ids:
+            if any(value is None for value in id_.values()):
+                # NULL values won't match a IN clause, falling back
+                if self.read(**id_).first():
+                    found.add(self._challenge_key(id_))
+                continue
+            by_shape[tuple(sorted(id_))].append(id_)
+
+        for keys, shape_ids in by_shape.items():
+            columns = [getattr(Article, key) for key in keys]
+            for i in range(0, len(shape_ids), chunk_size):
+                chunk = shape_ids[i:i + chunk_size]
+                filters = {}
+                for key in keys:
+                    values = {id_[key] for id_ in chunk}
+                    if len(values) == 1:
+                        filters[key] = values.pop()
+                    else:
+                        filters['%s__in' % key] = values
+                for row in self.read(**filters).with_entities(*columns):
+                    found.add(tuple(zip(keys, row)))
+
+        return [id_ for id_ in ids if self._challenge_key(id_) not in found]
+
+    def _challenge_key(self, id_):
+        # user restriction overrides any user_id passed along (see _get)
+        if self.user_id and self._user_id_key in id_:
+            id_ = dict(id_, **{self._user_id_key: self.user_id})
+        return tuple(sorted(id_.items()))
+
     def count_by_category(self, **filters):
         return self._count_by(Article.category_id, filters)
 
@@ -37,40 +96,160 @@ class ArticleController(AbstractController):
                                         User.last_connection >= last_conn_max)
                               .group_by(Article.user_id).all())
 
-    def create(self, **attrs):
-        # handling special denorm for article rights
-        assert 'feed_id' in attrs, "must provide feed_id when creating article"
-        feed = FeedController(
-                attrs.get('user_id', self.user_id)).get(id=attrs['feed_id'])
+    def __denorm_from_feed(self, attrs, feed):
+        """Will set rights and denormalized fields from feed on attrs"""
         if 'user_id' in attrs:
             assert feed.user_id == attrs['user_id'] or self.user_id is None, \
                     "no right on feed %r" % feed.id
         attrs['user_id'], attrs['category_id'] = feed.user_id, feed.category_id
+        return attrs
 
-        # handling feed's filters
-        for filter_ in feed.filters or []:
-            match = False
-            if filter_.get('type') == 'regex':
-                match = re.match(filter_['pattern'], attrs.get('title', ''))
-            elif filter_.get('type') == 'simple match':
-                match = filter_['pattern'] in attrs.get('title', '')
-            take_action = match and filter_.get('action on') == 'match' \
-                    or not match and filter_.get('action on') == 'no match'
-
-            if not take_action:
-                continue
+    @staticmethod
+    def __fingerprint(attrs):
+        """Will keep the fingerprint of the title in sync with it"""
+        if 'title' in attrs:
+            attrs['title_fingerprint'] = title_fingerprint(attrs['title'])
+        return attrs
 
-            if filter_.get('action') == 'mark as read':
-                attrs['readed'] = True
+    @staticmethod
+    def __apply_filters(feed, attrs_list):
+        """Will apply the feed's filters on articles at once"""
+        titles = [attrs.get('title', '') for attrs in attrs_list]
+        for attrs, filtered in zip(attrs_list,
+                get_filters(feed).apply_many(titles)):
+            if filtered.get('readed'):
                 logger.warn("article %s will be created as read",
                             attrs['link'])
-            elif filter_.get('action') == 'mark as favorite':
-                attrs['like'] = True
+            if filtered.get('like'):
                 logger.warn("article %s will be created as liked",
                             attrs['link'])
+            attrs.update(filtered)
+
+    def __counted(self, filters, attrs):
+        """Returns the counters deltas implied by setting attrs on the
+        articles matching filters, with the state they're in now"""
+        if not any(key in attrs for key in COUNTED_FIELDS):
+            return []
+        rows = self._get(**filters).with_entities(Article.feed_id,
+                Article.category_id, Article.readed, func.count(Article.id))\
+                .group_by(Article.feed_id, Article.category_id,
+                          Article.readed)
+        deltas = []
+        for feed_id, category_id, readed, count in rows:
+            deltas.append((feed_id, category_id, readed, -count))
+            deltas.append((attrs.get('feed_id', feed_id),
+                           attrs.get('category_id', category_id),
+                           attrs.get('readed', readed), count))
+        return deltas
 
+    @staticmethod
+    def __update_counters(deltas):
+        """Applies, within the current transaction, deltas made of
+        (feed_id, category_id, readed, count) to the unread and total
+        counters of feeds and categories"""
+        by_obj = defaultdict(lambda: [0, 0])
+        for feed_id, category_id, readed, count in deltas:
+            for model, obj_id in (Feed, feed_id), (Category, category_id):
+                if obj_id:
+                    by_obj[model, obj_id][0] += 0 if readed else count
+                    by_obj[model, obj_id][1] += count
+        # grouping objects that move the same way in a single statement
+        by_delta = defaultdict(list)
+        for (model, obj_id), (unread, total) in by_obj.items():
+            if unread or total:
+                by_delta[model, unread, total].append(obj_id)
+        for (model, unread, total), obj_ids in by_delta.items():
+            model.query.filter(model.id.in_(obj_ids)).update(
+                    {model.unread_count: model.unread_count + unread,
+                     model.article_count: model.article_count + total},
+                    synchronize_session=False)
+
+    def create(self, **attrs):
+        # handling special denorm for article rights
+        assert 'feed_id' in attrs, "must provide feed_id when creating article"
+        feed = FeedController(
+                attrs.get('user_id', self.user_id)).get(id=attrs['feed_id'])
+        self.__apply_filters(feed, [self.__denorm_from_feed(attrs, feed)])
+        self.__fingerprint(attrs)
+        self.__update_counters([(attrs['feed_id'], attrs['category_id'],
+                                 attrs.get('readed', False), 1)])
         return super().create(**attrs)
 
+    def create_many(self, attrs_list):
+        """Will create all the articles in a single transaction, each feed
+        being loaded once and its filters applied to all its articles at
+        once, whatever the number of articles it's got. Should the
+        transaction fail on a constraint, the articles are created one by
+        one, the failing ones being returned as the error they raised."""
+        feeds, results, by_feed = {}, [], defaultdict(list)
+        for attrs in attrs_list:
+            try:
+                assert 'feed_id' in attrs, \
+                        "must provide feed_id when creating article"
+                key = (attrs.get('user_id', self.user_id), attrs['feed_id'])
+                if key not in feeds:
+                    try:
+                        feeds[key] = FeedController(key[0]).get(id=key[1])
+                    except Exception as error:
+                        feeds[key] = error
+                if isinstance(feeds[key], Exception):
+                    raise feeds[key]
+                by_feed[key].append(self.__fingerprint(
+                        self.__denorm_from_feed(attrs, feeds[key])))
+                results.append(attrs)
+            except Exception as error:
+                results.append(error)
+        for key, feed_attrs in by_feed.items():
+            self.__apply_filters(feeds[key], feed_attrs)
+        try:
+            return self.__insert(results)
+        except IntegrityError as error:
+            db.session.rollback()
+            logger.warn('inserting %d articles at once failed (%r), '
+                        'inserting them one by one', len(results), error)
+        for index, attrs in enumerate(results):
+            if isinstance(attrs, Exception):
+                continue
+            try:
+                results[index] = self.__insert([attrs])[0]
+            except IntegrityError as error:
+                db.session.rollback()
+                results[index] = error
+        return results
+
+    def __insert(self, results):
+        """Inserts in a single transaction the articles out of the
+        attributes among results, returns results with those articles"""
+        results = [result if isinstance(result, Exception)
+                   else Article(**result) for result in results]
+        created = [obj for obj in results if isinstance(obj, Article)]
+        db.session.add_all(created)
+        self.__update_counters([(obj.feed_id, obj.category_id,
+                                 bool(obj.readed), 1) for obj in created])
+        self._bump_versions({obj.user_id for obj in created})
+        db.session.commit()
+        return results
+
+    def update_many(self, mappings):
+        """Will update articles from a list of dicts holding their id and
+        the new values, in a single transaction; rights aren't checked"""
+        if not mappings:
+            return 0
+        by_readed = defaultdict(list)
+        for mapping in mappings:
+            self.__fingerprint(mapping)
+            if 'readed' in mapping:
+                by_readed[mapping['readed']].append(mapping['id'])
+        deltas = []
+        for readed, ids in by_readed.items():
+            deltas.extend(self.__counted({'id__in': ids}, {'readed': readed}))
+        self.__update_counters(deltas)
+        db.session.bulk_update_mappings(Article, mappings)
+        self._bump_versions(filters={'id__in': [mapping['id']
+                                                    for mapping in mappings]})
+        db.session.commit()
+        return len(mappings)
+
     def update(self, filters, attrs):
         user_id = attrs.get('user_id', self.user_id)
         if 'feed_id' in attrs:
@@ -82,7 +261,44 @@ class ArticleController(AbstractController):
             cat = CategoryController().get(id=attrs['category_id'])
             assert self.user_id is None or cat.user_id == user_id, \
                     "no right on cat %r" % cat.id
-        return super().update(filters, attrs)
+        self.__update_counters(self.__counted(dict(filters), attrs))
+        return super().update(filters, self.__fingerprint(attrs))
+
+    def mark_as_read(self, **filters):
+        """Will mark the unread articles matching filters as read in a single
+        statement (UPDATE ... RETURNING on postgresql, a lookup followed by
+        updates on primary keys elsewhere) and returns the id, feed_id,
+        category_id and user_id of the articles it changed."""
+        filters['readed'] = False
+        if self.user_id:
+            filters[self._user_id_key] = self.user_id
+        where = and_(*self._to_filters(**filters))
+        columns = (Article.id, Article.feed_id, Article.category_id,
+                   Article.user_id)
+        if db.engine.dialect.name == 'postgresql':
+            rows = db.session.execute(Article.__table__.update().where(where)
+                    .values(readed=True).returning(*columns)).fetchall()
+        else:
+            rows = Article.query.filter(where).with_entities(*columns).all()
+            for i in range(0, len(rows), CHALLENGE_CHUNK_SIZE):
+                Article.query.filter(Article.id.in_(
+                        [row[0] for row in rows[i:i + CHALLENGE_CHUNK_SIZE]]))\
+                        .update({'readed': True}, synchronize_session=False)
+        deltas = []
+        for (feed_id, category_id), count in Counter(
+                (row[1], row[2]) for row in rows).items():
+            deltas.append((feed_id, category_id, False, -count))
+            deltas.append((feed_id, category_id, True, count))
+        self.__update_counters(deltas)
+        self._bump_versions({row[3] for row in rows})
+        db.session.commit()
+        return rows
+
+    def delete(self, obj_id):
+        article = self.get(id=obj_id)
+        self.__update_counters([(article.feed_id, article.category_id,
+                                 article.readed, -1)])
+        return super().delete(obj_id)
 
     def get_history(self, year=None, month=None):
         "Sort articles by year and month."
@@ -103,6 +319,38 @@ class ArticleController(AbstractController):
         return articles_counter, articles
 
     def read_light(self, **filters):
+        # ordered as idx_article_uid_date_id so that pages are read from it
         return super().read(**filters).with_entities(Article.id, Article.title,
                 Article.readed, Article.like, Article.feed_id, Article.date,
-                Article.category_id).order_by(Article.date.desc())
+                Article.category_id).order_by(Article.date.desc(),
+                                              Article.id)
+
+    def search(self, terms, fields=full_text.FIELDS, offset=0,
+               limit=ARTICLES_PAGE_SIZE, **filters):
+        """Full text search of terms within fields of the articles matching
+        filters, the most relevant first. Returns the articles of the page
+        and the offset of the next one, None if it was the last."""
+        query = full_text.ranked(db.engine,
+                self.read_light(**filters).order_by(None), Article,
+                terms, fields).order_by(Article.date.desc(), Article.id)
+        articles = query.offset(offset).limit(limit + 1).all()
+        if len(articles) <= limit:
+            return articles, None
+        return articles[:limit], offset + limit
+
+    def read_page(self, cursor=None, limit=ARTICLES_PAGE_SIZE, **filters):
+        """Keyset pagination over read_light. Cursor is the (date, id) of
+        the last article of the previous page, so that fetching a page
+        costs the same whatever its depth. Returns the articles of the page
+        and the cursor to the next one, None if it was the last."""
+        query = self.read_light(**filters)
+        if cursor is not None:
+            date, id_ = cursor
+            query = query.filter(or_(Article.date < date,
+                                     and_(Article.date == date,
+                                          Article.id > id_)))
+        articles = query.limit(limit + 1).all()
+        if len(articles) <= limit:
+            return articles, None
+        articles = articles[:limit]
+        return articles, (articles[-1].date, articles[-1].id)
@@ -5,6 +5,7 @@ from .feed import FeedController
 
 class CategoryController(AbstractController):
     _db_cls = Category
+    _bumped_versions = ('menu_version',)
 
     def delete(self, obj_id):
         FeedController(self.user_id).update({'category_id': obj_id},
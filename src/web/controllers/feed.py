@@ -1,116 +1,184 @@
 import logging
-import itertools
+from collections import defaultdict
 from datetime import datetime, timedelta
+from sqlalchemy import case, select, and_, func
 
-from bootstrap import conf
+from bootstrap import db, conf
 from .abstract import AbstractController
 from .icon import IconController
-from web.models import User, Feed
-from web.lib.utils import clear_string
+from web.models import User, Feed, Category, Article
+from web.lib import feed_filters
 
 logger = logging.getLogger(__name__)
 DEFAULT_LIMIT = 5
+ARRIVAL_WINDOW = timedelta(days=7)
+# articles of the same title published further apart aren't duplicates
+DUPLICATES_WINDOW = timedelta(days=1)
 
 
 class FeedController(AbstractController):
     _db_cls = Feed
+    _bumped_versions = ('menu_version', 'feeds_version')
 
     def __get_art_contr(self):
         from .article import ArticleController
         return ArticleController(self.user_id)
 
-    def list_late(self, delta, max_error=conf.FEED_ERROR_MAX,
-                  limit=DEFAULT_LIMIT):
-        """Will list either late feed (which have been retrieved for the last
-        time sooner than now minus the delta (default to 1h)) or the feed with
-        articles recentrly created (later than now minus a quarter the delta
-        (default to 15 logically)).
-
-        The idea is to keep very active feed up to date and to avoid missing
-        articles du to high activity (when, for example, the feed only displays
-        its 30 last entries and produces more than one per minutes).
+    @staticmethod
+    def _late_filters(now, max_error=conf.FEED_ERROR_MAX, refresh_rate=None):
+        filters = {'error_count__lt': max_error, 'enabled': True}
+        due = {'next_retrieval__le': now}
+        if refresh_rate is None:
+            filters.update(due)
+        else:
+            filters['__or__'] = [due, {'last_retrieved__lt':
+                                       now - timedelta(minutes=refresh_rate)}]
+        return filters
+
+    def list_late(self, delta=None, max_error=conf.FEED_ERROR_MAX,
+                  limit=DEFAULT_LIMIT, refresh_rate=None):
+        """Will list the feeds which next retrieval is due (for more than
+        delta if provided), most overdue first. If a refresh rate (in
+        minutes) is provided, feeds that haven't been retrieved for that
+        long will be listed as well, whatever their schedule.
 
         Feeds of inactive (not connected for more than a month) or manually
         desactivated users are ignored.
         """
-        tenth = delta / 10
-        feed_last_retrieved = datetime.utcnow() - delta
-        art_last_retr = datetime.utcnow() - (2 * tenth)
-        last_conn_max = datetime.utcnow() - timedelta(days=30)
-        min_wait = datetime.utcnow() - tenth
-        ac = self.__get_art_contr()
-        new_art_feed = (ac.read(retrieved_date__gt=art_last_retr,
-                                retrieved_date__lt=min_wait)
-                          .with_entities(ac._db_cls.feed_id)
-                          .distinct())
-
-        query = (self.read(error_count__lt=max_error, enabled=True,
-                           __or__=[{'last_retrieved__lt': feed_last_retrieved},
-                                   {'last_retrieved__lt': min_wait,
-                                    'id__in': new_art_feed}])
+        now = datetime.utcnow()
+        last_conn_max = now - timedelta(days=30)
+        filters = self._late_filters(now - (delta or timedelta()),
+                                     max_error, refresh_rate)
+        query = (self.read(**filters)
                      .join(User).filter(User.is_active == True,
                                         User.last_connection >= last_conn_max)
-                     .order_by(Feed.last_retrieved))
+                     .order_by(Feed.next_retrieval))
         if limit:
             query = query.limit(limit)
         yield from query
 
+    def get_refresh_delays(self, feeds, window=ARRIVAL_WINDOW):
+        """Will compute for each feed the delay before its next retrieval.
+
+        Feeds are fetched twice as often as their articles arrived during
+        the window, between FEED_MIN_REFRESH_RATE and FEED_REFRESH_RATE
+        minutes. Feeds that remained silent are only fetched every
+        FEED_MAX_REFRESH_RATE minutes. Each error doubles the delay.
+        """
+        arrivals = self.__get_art_contr().count_by_feed(
+                feed_id__in=[feed.id for feed in feeds],
+                retrieved_date__gt=datetime.utcnow() - window)
+        min_delay = timedelta(minutes=conf.FEED_MIN_REFRESH_RATE)
+        active_delay = timedelta(minutes=conf.FEED_REFRESH_RATE)
+        max_delay = timedelta(minutes=conf.FEED_MAX_REFRESH_RATE)
+        delays = {}
+        for feed in feeds:
+            if arrivals.get(feed.id):
+                delay = window / arrivals[feed.id] / 2
+                delay = min(max(delay, min_delay), active_delay)
+            else:
+                delay = max_delay
+            delays[feed.id] = min(delay * 2 ** (feed.error_count or 0),
+                                  max_delay)
+        return delays
+
     def list_fetchable(self, max_error=conf.FEED_ERROR_MAX,
-            limit=DEFAULT_LIMIT, refresh_rate=conf.FEED_REFRESH_RATE):
-        now, delta = datetime.utcnow(), timedelta(minutes=refresh_rate)
-        feeds = list(self.list_late(delta, max_error, limit))
-        if feeds:
-            self.update({'id__in': [feed.id for feed in feeds]},
-                        {'last_retrieved': now})
-        return feeds
-
-    def get_duplicates(self, feed_id):
+            limit=DEFAULT_LIMIT, refresh_rate=None):
+        """Will claim and return the feeds to fetch.
+
+        Late feeds are claimed with a single UPDATE which conditions are
+        the ones that made them late. Claiming sets last_retrieved and
+        pushes next_retrieval in the future so a feed another crawler
+        claimed in the meantime won't match anymore. Postgres re-evaluates
+        those conditions on rows locked by a concurrent claim and returns
+        the claimed rows; elsewhere they're read again by their claim date.
         """
-        Compare a list of documents by pair.
+        now = datetime.utcnow()
+        feeds = list(self.list_late(max_error=max_error, limit=limit,
+                                    refresh_rate=refresh_rate))
+        if not feeds:
+            return feeds
+        delays = self.get_refresh_delays(feeds)
+        filters = self._late_filters(now, max_error, refresh_rate)
+        filters['id__in'] = [feed.id for feed in feeds]
+        next_retrievals = {feed_id: now + delay
+                           for feed_id, delay in delays.items()}
+        values = {'last_retrieved': now,
+                  'next_retrieval': case(next_retrievals, value=Feed.id)}
+        if db.engine.dialect.name == 'postgresql':
+            claimed = {row[0] for row in db.session.execute(
+                    Feed.__table__.update()
+                        .where(self._get(**filters).whereclause)
+                        .values(**values).returning(Feed.id))}
+        else:
+            self._get(**filters).update(values, synchronize_session=False)
+            claimed = {row[0] for row in self.read(
+                    id__in=filters['id__in'], last_retrieved=now)
+                    .with_entities(Feed.id)}
+        db.session.commit()
+        return [feed for feed in feeds if feed.id in claimed]
+
+    def get_duplicates(self, feed_id, window=DUPLICATES_WINDOW):
+        """
+        Looks for the articles of the feed which titles share a fingerprint
+        and were published within window of each other.
         Pairs of duplicates are sorted by "retrieved date".
         """
         feed = self.get(id=feed_id)
+        shared = db.session.query(Article.title_fingerprint)\
+                .filter(Article.feed_id == feed.id)\
+                .group_by(Article.title_fingerprint)\
+                .having(func.count(Article.id) > 1)
+        buckets = defaultdict(list)
+        for article in db.session.query(Article.id, Article.title,
+                    Article.date, Article.retrieved_date,
+                    Article.title_fingerprint)\
+                .filter(Article.feed_id == feed.id,
+                        Article.title_fingerprint.in_(shared.statement))\
+                .order_by(Article.date.desc()):
+            buckets[article.title_fingerprint].append(article)
         duplicates = []
-        for pair in itertools.combinations(feed.articles, 2):
-            date1, date2 = pair[0].date, pair[1].date
-            if clear_string(pair[0].title) == clear_string(pair[1].title) \
-                    and (date1 - date2) < timedelta(days=1):
-                if pair[0].retrieved_date < pair[1].retrieved_date:
-                    duplicates.append((pair[0], pair[1]))
-                else:
-                    duplicates.append((pair[1], pair[0]))
+        for bucket in buckets.values():
+            for i, first in enumerate(bucket):
+                for second in bucket[i + 1:]:
+                    if first.date - second.date >= window:
+                        break
+                    if first.retrieved_date < second.retrieved_date:
+                        duplicates.append((first, second))
+                    else:
+                        duplicates.append((second, first))
         return feed, duplicates
 
     def get_inactives(self, nb_days):
+        """Returns the feeds which last article is more than nb_days old
+        along the time elapsed since, the most inactive first"""
         today = datetime.utcnow()
-        inactives = []
-        for feed in self.read():
-            try:
-                last_post = feed.articles[0].date
-            except IndexError:
-                continue
-            elapsed = today - last_post
-            if elapsed > timedelta(days=nb_days):
-                inactives.append((feed, elapsed))
-        inactives.sort(key=lambda tup: tup[1], reverse=True)
-        return inactives
+        last_posts = db.session.query(Article.feed_id,
+                func.max(Article.date).label('last_post'))
+        if self.user_id:
+            last_posts = last_posts.filter(Article.user_id == self.user_id)
+        last_posts = last_posts.group_by(Article.feed_id)\
+                .having(func.max(Article.date)
+                        < today - timedelta(days=nb_days)).subquery()
+        query = self._get().join(last_posts, last_posts.c.feed_id == Feed.id)\
+                .add_columns(last_posts.c.last_post)\
+                .order_by(last_posts.c.last_post)
+        return [(feed, today - last_post) for feed, last_post in query]
 
     def count_by_category(self, **filters):
         return self._count_by(Feed.category_id, filters)
 
     def _ensure_icon(self, attrs):
-        if not attrs.get('icon_url'):
-            return
-        icon_contr = IconController()
-        if not icon_contr.read(url=attrs['icon_url']).count():
-            icon_contr.create(**{'url': attrs['icon_url']})
+        """Will have the icon created, its content being retrieved in the
+        background, if it doesn't exist yet or its retrieval failed"""
+        if attrs.get('icon_url'):
+            IconController().ensure(attrs['icon_url'])
 
     def __clean_feed_fields(self, attrs):
         if attrs.get('category_id') == 0:
             attrs['category_id'] = None
         if 'filters' in attrs:
-            attrs['filters'] = [filter_ for filter_ in attrs['filters']
-                                if type(filter_) is dict]
+            attrs['filters'] = feed_filters.validate(attrs['filters'])
 
     def create(self, **attrs):
         self._ensure_icon(attrs)
@@ -120,8 +188,41 @@ class FeedController(AbstractController):
     def update(self, filters, attrs):
         self._ensure_icon(attrs)
         self.__clean_feed_fields(attrs)
+        if 'filters' in attrs:
+            feed_filters.invalidate(*[feed_id for feed_id, in
+                    self.read(**filters).with_entities(self._db_cls.id)])
         if 'category_id' in attrs:
             for feed in self.read(**filters):
                 self.__get_art_contr().update({'feed_id': feed.id},
                         {'category_id': attrs['category_id']})
         return super().update(filters, attrs)
+
+    def delete(self, obj_id):
+        feed = self.get(id=obj_id)
+        if feed.category_id:  # its articles won't be counted any more
+            Category.query.filter(Category.id == feed.category_id).update(
+                    {Category.unread_count:
+                        Category.unread_count - feed.unread_count,
+                     Category.article_count:
+                        Category.article_count - feed.article_count},
+                    synchronize_session=False)
+        return super().delete(obj_id)
+
+    def reconcile_counters(self):
+        """Recomputes from the articles the unread and total counters of
+        the feeds and categories (of the user if any)"""
+        article = Article.__table__
+        for model, column in ((Feed, article.c.feed_id),
+                              (Category, article.c.category_id)):
+            table = model.__table__
+            query = table.update().values(
+                    unread_count=select([func.count(article.c.id)]).where(
+                        and_(column == table.c.id,
+                             article.c.readed == False)).as_scalar(),
+                    article_count=select([func.count(article.c.id)]).where(
+                        column == table.c.id).as_scalar())
+            if self.user_id:
+                query = query.where(table.c.user_id == self.user_id)
+            db.session.execute(query)
+        self._bump_versions(filters={})
+        db.session.commit()
@@ -1,6 +1,8 @@
-import base64
-import requests
+from datetime import datetime, timedelta
+
+from bootstrap import conf, db
 from web.models import Icon
+from web.lib import icon_store, icon_fetcher
 from .abstract import AbstractController
 
 
@@ -9,15 +11,46 @@ class IconController(AbstractController):
     _user_id_key = None
 
     def _build_from_url(self, attrs):
-        if 'url' in attrs and 'content' not in attrs:
-            resp = requests.get(attrs['url'], verify=False)
-            attrs.update({'url': resp.url,
-                    'mimetype': resp.headers.get('content-type', None),
-                    'content': base64.b64encode(resp.content).decode('utf8')})
+        if 'content' in attrs:
+            attrs['digest'] = icon_store.store(attrs.pop('content'))
         return attrs
 
     def create(self, **attrs):
-        return super().create(**self._build_from_url(attrs))
+        """Without content, the icon is created empty and its content is
+        retrieved in the background"""
+        icon = super().create(**self._build_from_url(attrs))
+        if not icon.digest:
+            icon_fetcher.schedule(icon.url)
+        return icon
+
+    def ensure(self, url):
+        """Has the icon of url created if it doesn't exist yet, or its
+        retrieval tried again if it last failed over ICON_RETRY_DELAY
+        seconds ago"""
+        icon = self.read(url=url).first()
+        if icon is None:
+            return self.create(url=url)
+        if not icon.digest and (icon.last_attempt is None
+                or icon.last_attempt < datetime.utcnow()
+                    - timedelta(seconds=conf.ICON_RETRY_DELAY)):
+            icon_fetcher.schedule(url)
+        return icon
 
     def update(self, filters, attrs):
         return super().update(filters, self._build_from_url(attrs))
+
+    def delete(self, url):
+        """Icons are identified by their url, their content is left in the
+        store as other icons may share it"""
+        icon = self.get(url=url)
+        db.session.delete(icon)
+        db.session.commit()
+        return icon
+
+    def get_digests(self, urls):
+        """Returns the digest of the content of the icons of urls"""
+        urls = {url for url in urls if url}
+        if not urls:
+            return {}
+        return dict(self.read(url__in=urls).with_entities(Icon.url,
+                                                           Icon.digest))
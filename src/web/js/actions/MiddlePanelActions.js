@@ -4,6 +4,7 @@ var jquery = require('jquery');
 var MiddlePanelStore = require('../stores/MiddlePanelStore');
 
 var _last_fetched_with = {};
+var _loading_page = null;  // cursor of the page being loaded
 var shouldFetch = function(filters) {
     return true;  // FIXME disabling intelligent fetch for now, no caching better that bad one
 //    if(filters.filter != null // undefined means unchanged
@@ -39,6 +40,7 @@ var reloadIfNecessaryAndDispatch = function(dispath_payload) {
         jquery.getJSON('/middle_panel', filters,
                 function(payload) {
                     dispath_payload.articles = payload.articles;
+                    dispath_payload.next_page = payload.next_page;
                     dispath_payload.filters = filters;
                     JarrDispatcher.dispatch(dispath_payload);
                     _last_fetched_with = MiddlePanelStore.getRequestFilter();
@@ -70,6 +72,34 @@ var MiddlePanelActions = {
             display_search: false,
         });
     },
+    loadMore: function() {
+        var cursor = MiddlePanelStore.getNextPage();
+        if(!cursor || _loading_page == cursor) {
+            return;
+        }
+        _loading_page = cursor;
+        var filters = MiddlePanelStore.getRequestFilter();
+        for(var key in filters) {
+            if(filters[key] == null) {
+                delete filters[key];
+            }
+        }
+        filters.cursor = cursor;
+        jquery.getJSON('/middle_panel', filters, function(payload) {
+            // ignoring pages of a listing that has been reloaded since
+            if(MiddlePanelStore.getNextPage() == cursor) {
+                JarrDispatcher.dispatch({
+                    type: ActionTypes.LOAD_MORE_ARTICLES,
+                    articles: payload.articles,
+                    next_page: payload.next_page,
+                });
+            }
+        }).always(function() {
+            if(_loading_page == cursor) {
+                _loading_page = null;
+            }
+        });
+    },
     removeParentFilter: function() {
         reloadIfNecessaryAndDispatch({
             type: ActionTypes.PARENT_FILTER,
@@ -143,6 +173,8 @@ var MiddlePanelActions = {
                     JarrDispatcher.dispatch({
                         type: ActionTypes.MARK_ALL_AS_READ,
                         articles: payload.articles,
+                        feeds: payload.feeds,
+                        categories: payload.categories,
                     });
                 },
         });
@@ -16,8 +16,7 @@ var TableLine = React.createClass({
                 feed_title: React.PropTypes.string.isRequired,
                 icon_url: React.PropTypes.string,
                 title: React.PropTypes.string.isRequired,
-                rel_date: React.PropTypes.string.isRequired,
-                date: React.PropTypes.string.isRequired,
+                timestamp: React.PropTypes.number.isRequired,
                 read: React.PropTypes.bool.isRequired,
                 selected: React.PropTypes.bool.isRequired,
                 liked: React.PropTypes.bool.isRequired,
@@ -50,8 +49,7 @@ var TableLine = React.createClass({
         }
         return (<div className={clsses} onClick={this.loadArticle} title={this.props.title}>
                     <span>{title}</span>
-                    <JarrTime text={this.props.date}
-                              stamp={this.props.rel_date} />
+                    <JarrTime timestamp={this.props.timestamp} />
                     <div>{read} {liked} {this.props.title}</div>
                 </div>
         );
@@ -236,8 +234,7 @@ var MiddlePanel = React.createClass({
                                         icon_url={article.icon_url}
                                         read={article.read}
                                         liked={article.liked}
-                                        rel_date={article.rel_date}
-                                        date={article.date}
+                                        timestamp={article.timestamp}
                                         selected={article.selected}
                                         article_id={article.article_id}
                                         feed_id={article.feed_id}
@@ -251,9 +248,24 @@ var MiddlePanel = React.createClass({
     componentDidMount: function() {
         MiddlePanelActions.reload();
         MiddlePanelStore.addChangeListener(this._onChange);
+        this._container = document.getElementById('middle-panel');
+        if(this._container) {
+            this._container.addEventListener('scroll', this._onScroll);
+        }
     },
     componentWillUnmount: function() {
         MiddlePanelStore.removeChangeListener(this._onChange);
+        if(this._container) {
+            this._container.removeEventListener('scroll', this._onScroll);
+        }
+    },
+    _onScroll: function() {
+        var panel = this._container;
+        // loading the next page before the bottom is actually reached
+        if(panel.scrollTop + panel.clientHeight
+                >= panel.scrollHeight - panel.clientHeight) {
+            MiddlePanelActions.loadMore();
+        }
     },
     _onChange: function() {
         this.setState({filter: MiddlePanelStore._datas.filter,
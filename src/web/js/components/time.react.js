@@ -1,11 +1,43 @@
 var React = require('react');
 
+var RELATIVE_UNITS = [['year', 31536000], ['month', 2592000],
+                      ['week', 604800], ['day', 86400],
+                      ['hour', 3600], ['minute', 60], ['second', 1]];
+// the locale of the user, set by the server on the page
+var LOCALE = document.documentElement.lang || undefined;
+var relativeFormat = null;
+if(typeof Intl !== 'undefined' && Intl.RelativeTimeFormat) {
+    relativeFormat = new Intl.RelativeTimeFormat(LOCALE, {numeric: 'auto'});
+}
+
+var relativeStamp = function(timestamp) {
+    var delta = Math.round(Date.now() / 1000 - timestamp);
+    for(var i = 0; i < RELATIVE_UNITS.length; i++) {
+        var count = Math.round(delta / RELATIVE_UNITS[i][1]);
+        if(Math.abs(count) >= 1) {
+            return relativeFormat.format(-count, RELATIVE_UNITS[i][0]);
+        }
+    }
+    return relativeFormat.format(0, 'second');
+};
+
 var JarrTime = React.createClass({
-    propTypes: {stamp: React.PropTypes.string.isRequired,
-                text: React.PropTypes.string.isRequired},
+    // either stamp and text, already formatted, or an epoch timestamp
+    // (in seconds) localized here
+    propTypes: {stamp: React.PropTypes.string,
+                text: React.PropTypes.string,
+                timestamp: React.PropTypes.number},
     render: function() {
-        return (<time dateTime={this.props.text} title={this.props.text}>
-                    {this.props.stamp}
+        var text = this.props.text, stamp = this.props.stamp;
+        if(this.props.timestamp !== undefined) {
+            var date = new Date(this.props.timestamp * 1000);
+            text = date.toLocaleString(LOCALE);
+            // browsers without relative formatting get the full date
+            stamp = relativeFormat ? relativeStamp(this.props.timestamp)
+                                   : text;
+        }
+        return (<time dateTime={text} title={text}>
+                    {stamp}
                 </time>);
     },
 });
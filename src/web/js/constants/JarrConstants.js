@@ -8,6 +8,7 @@ module.exports = keyMirror({
         CHANGE_ATTR: null,  // edit an attr on an article (like / read)
         RELOAD_MIDDLE_PANEL: null,
         MIDDLE_PANEL_FILTER: null,  // set a filter (read/like/all)
+        LOAD_MORE_ARTICLES: null,  // append the next page of articles
         LOAD_ARTICLE: null,  // load a single article in right panel
         MARK_ALL_AS_READ: null,
 });
@@ -114,16 +114,16 @@ MenuStore.dispatchToken = JarrDispatcher.register(function(action) {
             MenuStore.emitChange();
             break;
         case ActionTypes.MARK_ALL_AS_READ:
-            action.articles.map(function(art) {
-                if(!art.read) {
-                    MenuStore._datas.feeds[art.feed_id].unread -= 1;
-                    if(art.category_id) {
-                        MenuStore._datas.categories[art.category_id].unread -= 1;
-
-                    }
+            for(var feed_id in action.feeds) {
+                if(feed_id in MenuStore._datas.feeds) {
+                    MenuStore._datas.feeds[feed_id].unread -= action.feeds[feed_id];
                 }
-            });
-
+            }
+            for(var category_id in action.categories) {
+                if(category_id in MenuStore._datas.categories) {
+                    MenuStore._datas.categories[category_id].unread -= action.categories[category_id];
+                }
+            }
             MenuStore._datas.all_folded = null;
             MenuStore.emitChange();
             break;
@@ -8,7 +8,7 @@ var assign = require('object-assign');
 var MiddlePanelStore = assign({}, EventEmitter.prototype, {
     filter_whitelist: ['filter', 'filter_id', 'filter_type', 'display_search',
                        'query', 'search_title', 'search_content'],
-    _datas: {articles: [], selected_article: null,
+    _datas: {articles: [], selected_article: null, next_page: null,
              filter: 'unread', filter_type: null, filter_id: null,
              display_search: false, query: null,
              search_title: true, search_content: false},
@@ -51,13 +51,29 @@ var MiddlePanelStore = assign({}, EventEmitter.prototype, {
         }.bind(this));
 
     },
-    setArticles: function(articles) {
+    setArticles: function(articles, next_page) {
         if(articles || articles == []) {
             this._datas.articles = articles;
+            this._datas.next_page = next_page || null;
             return true;
         }
         return false;
     },
+    appendArticles: function(articles, next_page) {
+        var known = {};
+        this._datas.articles.map(function(article) {
+            known[article.article_id] = true;
+        });
+        this._datas.articles = this._datas.articles.concat(
+                articles.filter(function(article) {
+                    return !known[article.article_id];
+                }));
+        this._datas.next_page = next_page || null;
+        return articles.length > 0;
+    },
+    getNextPage: function() {
+        return this._datas.next_page;
+    },
     registerFilter: function(action) {
         var changed = false;
         this.filter_whitelist.map(function(key) {
@@ -86,13 +102,23 @@ MiddlePanelStore.dispatchToken = JarrDispatcher.register(function(action) {
             || action.type == ActionTypes.PARENT_FILTER
             || action.type == ActionTypes.MIDDLE_PANEL_FILTER) {
         changed = MiddlePanelStore.registerFilter(action);
-        changed = MiddlePanelStore.setArticles(action.articles) || changed;
+        changed = MiddlePanelStore.setArticles(action.articles,
+                                               action.next_page) || changed;
+    } else if (action.type == ActionTypes.LOAD_MORE_ARTICLES) {
+        changed = MiddlePanelStore.appendArticles(action.articles,
+                                                  action.next_page);
     } else if (action.type == ActionTypes.MARK_ALL_AS_READ) {
-        changed = MiddlePanelStore.registerFilter(action);
-        for(var i in action.articles) {
-            action.articles[i].read = true;
-        }
-        changed = MiddlePanelStore.setArticles(action.articles) || changed;
+        // action.articles only holds the ids of the articles marked as read
+        var marked = {};
+        action.articles.map(function(article_id) {
+            marked[article_id] = true;
+        });
+        MiddlePanelStore._datas.articles.map(function(article) {
+            if(marked[article.article_id] && !article.read) {
+                article.read = true;
+                changed = true;
+            }
+        });
     } else if (action.type == ActionTypes.CHANGE_ATTR) {
             var attr = action.attribute;
             var val = action.value_bool;
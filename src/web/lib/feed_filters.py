@@ -0,0 +1,120 @@
+"""
+Compiled version of the filters users set on their feeds.
+
+A filter is a dict like:
+
+    {'type': 'regex' or 'simple match', 'pattern': '...',
+     'action on': 'match' or 'no match',
+     'action': 'mark as read' or 'mark as favorite'}
+
+validate() enforces that schema on the filters stored on feeds.
+
+Each feed's filters are compiled once into matchers and kept in a cache
+keyed by feed id. FeedController.update invalidates an entry when the
+filters of the feed are modified; as other processes (the crawler, the web
+workers) hold their own cache, a cached entry is also checked against the
+filters of the feed it is asked for and recompiled if they differ.
+"""
+
+import re
+import copy
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+ACTIONS = {'mark as read': ('readed', True),
+           'mark as favorite': ('like', True)}
+TYPES = ('regex', 'simple match')
+ACTIONS_ON = ('match', 'no match')
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _never(title):
+    return False
+
+
+class CompiledFilters:
+
+    def __init__(self, filters):
+        self.source = copy.deepcopy(filters or [])
+        self.filters = []
+        for filter_ in self.source:
+            if filter_.get('action') not in ACTIONS \
+                    or filter_.get('action on') not in ACTIONS_ON:
+                continue
+            matcher = self._compile(filter_)
+            if matcher is None:
+                continue
+            self.filters.append((matcher, filter_['action on'] == 'match',
+                                 ACTIONS[filter_['action']]))
+
+    @staticmethod
+    def _compile(filter_):
+        pattern = filter_.get('pattern')
+        if filter_.get('type') == 'regex':
+            try:
+                return re.compile(pattern).match
+            except (re.error, TypeError):
+                logger.warn('ignoring invalid regex filter %r', pattern)
+                return None
+        elif filter_.get('type') == 'simple match':
+            if not isinstance(pattern, str):
+                return None
+            return lambda title: pattern in title
+        return _never
+
+    def apply(self, title):
+        """Returns the attributes the filters set on an article of title"""
+        return self.apply_many([title])[0]
+
+    def apply_many(self, titles):
+        """Evaluates every filter against titles, returns for each of them
+        the attributes to set on the article"""
+        results = [{} for _ in titles]
+        for matcher, on_match, (key, value) in self.filters:
+            for title, result in zip(titles, results):
+                if key not in result and bool(matcher(title)) is on_match:
+                    result[key] = value
+        return results
+
+
+def validate(filters):
+    """Returns the filters fitting the schema, stripped of unknown keys,
+    the others are dropped"""
+    valid = []
+    for filter_ in filters or []:
+        if not isinstance(filter_, dict) \
+                or filter_.get('type') not in TYPES \
+                or filter_.get('action on') not in ACTIONS_ON \
+                or filter_.get('action') not in ACTIONS \
+                or not isinstance(filter_.get('pattern'), str):
+            logger.warn('dropping invalid filter %r', filter_)
+            continue
+        if filter_['type'] == 'regex':
+            try:
+                re.compile(filter_['pattern'])
+            except re.error:
+                logger.warn('dropping filter with invalid regex %r',
+                            filter_['pattern'])
+                continue
+        valid.append({key: filter_[key]
+                      for key in ('type', 'pattern', 'action on', 'action')})
+    return valid
+
+
+def get_filters(feed):
+    """Returns the compiled filters of feed"""
+    with _cache_lock:
+        compiled = _cache.get(feed.id)
+    if compiled is None or compiled.source != (feed.filters or []):
+        compiled = CompiledFilters(feed.filters)
+        with _cache_lock:
+            _cache[feed.id] = compiled
+    return compiled
+
+
+def invalidate(*feed_ids):
+    with _cache_lock:
+        for feed_id in feed_ids:
+            _cache.pop(feed_id, None)
@@ -1,17 +1,29 @@
 import html
+import json
+import time
 import urllib
 import logging
 import requests
+import threading
 import feedparser
+import dateutil.parser
+from datetime import datetime, timedelta
 from bs4 import BeautifulSoup, SoupStrainer
 
 from bootstrap import conf
-from web.lib.utils import try_keys, try_get_icon_url, rebuild_url
+from web.lib.utils import (try_keys, try_get_icon_url, find_icon_url,
+                           probe_icon, rebuild_url, to_hash)
 
 logger = logging.getLogger(__name__)
 logging.captureWarnings(True)
 ACCEPTED_MIMETYPES = ('application/rss+xml', 'application/rdf+xml',
                       'application/atom+xml', 'application/xml', 'text/xml')
+REQUESTS_KWARGS = {'headers': {'User-Agent': conf.CRAWLER_USER_AGENT},
+                   'verify': False}
+# what sites tell about their feeds hardly ever changes
+SITE_CACHE_TTL = 6 * 3600
+_sites = {}
+_sites_lock = threading.Lock()
 
 
 def is_parsing_ok(parsed_feed):
@@ -30,15 +42,97 @@ def escape_keys(*keys):
     return wrapper
 
 
+def _check_keys(**kwargs):
+    def wrapper(elem):
+        for key, vals in kwargs.items():
+            if not elem.has_attr(key):
+                return False
+            if not all(val in elem.attrs[key] for val in vals):
+                return False
+        return True
+    return wrapper
+
+
+def _discover_site(site_link, site_split, feed_split):
+    """Retreives the page at site_link and returns what it tells about the
+    feed: its title, the url of its icon and its own url"""
+    # the favicon is probed while the page is being retreived
+    for split in site_split, feed_split:
+        if split is not None:
+            probe_icon(rebuild_url('/favicon.ico', split))
+    site = {}
+    try:
+        response = requests.get(site_link, timeout=conf.CRAWLER_TIMEOUT,
+                                **REQUESTS_KWARGS)
+    except Exception as error:
+        logger.warn('failed to retreive %r: %r', site_link, error)
+        return site
+    bs_parsed = BeautifulSoup(response.content, 'html.parser',
+                              parse_only=SoupStrainer('head'))
+    try:
+        site['title'] = bs_parsed.find_all('title')[0].text
+    except Exception:
+        pass
+
+    icons = bs_parsed.find_all(_check_keys(rel=['icon', 'shortcut']))
+    if not len(icons):
+        icons = bs_parsed.find_all(_check_keys(rel=['icon']))
+    candidates = [icon.attrs['href'] for icon in icons
+                  if icon.has_attr('href')] + ['/favicon.ico']
+    site['icon_url'] = find_icon_url(candidates, site_split, feed_split)
+
+    for type_ in ACCEPTED_MIMETYPES:
+        alternates = bs_parsed.find_all(_check_keys(
+                rel=['alternate'], type=[type_]))
+        if len(alternates) >= 1:
+            site['link'] = rebuild_url(alternates[0].attrs['href'],
+                                       feed_split)
+            break
+    return site
+
+
+def get_site(site_link, site_split, feed_split):
+    """Same as _discover_site, but each site is only queried once every
+    SITE_CACHE_TTL seconds"""
+    now = time.time()
+    with _sites_lock:
+        cached = _sites.get(site_link)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    site = _discover_site(site_link, site_split, feed_split)
+    with _sites_lock:
+        _sites[site_link] = now + SITE_CACHE_TTL, site
+    return site
+
+
+def get_metadata_hash(fp_parsed):
+    """Hash of the feed level fields of a parsed feed, the ones the
+    metadata of the feed are built from"""
+    return to_hash(json.dumps(fp_parsed.get('feed', {}), sort_keys=True,
+                              default=str))
+
+
+def is_metadata_outdated(feed, metadata_hash):
+    """Tells if the metadata of feed (a dumped one) are to be rebuilt,
+    because they were built from other feed level fields or because they
+    are older than FEED_METADATA_REFRESH_RATE"""
+    if feed.get('metadata_hash') != metadata_hash:
+        return True
+    refreshed = feed.get('metadata_refreshed')
+    if isinstance(refreshed, str):
+        refreshed = dateutil.parser.parse(refreshed)
+    return refreshed is None or refreshed < datetime.utcnow() \
+            - timedelta(minutes=conf.FEED_METADATA_REFRESH_RATE)
+
+
 @escape_keys('title', 'description')
 def construct_feed_from(url=None, fp_parsed=None, feed=None, query_site=True):
-    requests_kwargs = {'headers': {'User-Agent': conf.CRAWLER_USER_AGENT},
-                       'verify': False}
     if url is None and fp_parsed is not None:
         url = fp_parsed.get('url')
     if url is not None and fp_parsed is None:
         try:
-            response = requests.get(url, **requests_kwargs)
+            response = requests.get(url, timeout=conf.CRAWLER_TIMEOUT,
+                                    **REQUESTS_KWARGS)
             fp_parsed = feedparser.parse(response.content,
                                          request_headers=response.headers)
         except Exception as error:
@@ -71,53 +165,8 @@ def construct_feed_from(url=None, fp_parsed=None, feed=None, query_site=True):
             or all(bool(feed.get(k)) for k in ('link', 'title', 'icon_url')):
         return feed
 
-    try:
-        response = requests.get(feed['site_link'], **requests_kwargs)
-    except Exception as error:
-        logger.warn('failed to retreive %r: %r', feed['site_link'], error)
-        return feed
-    bs_parsed = BeautifulSoup(response.content, 'html.parser',
-                              parse_only=SoupStrainer('head'))
-
-    if not feed.get('title'):
-        try:
-            feed['title'] = bs_parsed.find_all('title')[0].text
-        except Exception:
-            pass
-
-    def check_keys(**kwargs):
-        def wrapper(elem):
-            for key, vals in kwargs.items():
-                if not elem.has_attr(key):
-                    return False
-                if not all(val in elem.attrs[key] for val in vals):
-                    return False
-            return True
-        return wrapper
-
-    if not feed.get('icon_url'):
-        icons = bs_parsed.find_all(check_keys(rel=['icon', 'shortcut']))
-        if not len(icons):
-            icons = bs_parsed.find_all(check_keys(rel=['icon']))
-        if len(icons) >= 1:
-            for icon in icons:
-                feed['icon_url'] = try_get_icon_url(icon.attrs['href'],
-                                                    site_split, feed_split)
-                if feed['icon_url'] is not None:
-                    break
-
-        if feed.get('icon_url') is None:
-            feed['icon_url'] = try_get_icon_url('/favicon.ico',
-                                                site_split, feed_split)
-        if 'icon_url' in feed and feed['icon_url'] is None:
-            del feed['icon_url']
-
-    if not feed.get('link'):
-        for type_ in ACCEPTED_MIMETYPES:
-            alternates = bs_parsed.find_all(check_keys(
-                    rel=['alternate'], type=[type_]))
-            if len(alternates) >= 1:
-                feed['link'] = rebuild_url(alternates[0].attrs['href'],
-                                           feed_split)
-                break
+    site = get_site(feed['site_link'], site_split, feed_split)
+    for key in 'title', 'icon_url', 'link':
+        if not feed.get(key) and site.get(key):
+            feed[key] = site[key]
     return feed
@@ -0,0 +1,110 @@
+"""
+Background retrieval of the icons.
+
+Creating or updating a feed only records the url of its icon (see
+FeedController._ensure_icon), the icon itself is fetched by a small pool
+of threads, with a timeout and a bound on its size. An url is fetched once
+whatever the number of feeds using it, and a host never has more than one
+of its icons being retrieved at a time. Once an icon is stored, the cached
+views of the users having feeds using it are outdated. Failures are dated
+on the icon, IconController.ensure tries again after ICON_RETRY_DELAY.
+"""
+
+import logging
+import threading
+import urllib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bootstrap import conf, db
+
+logger = logging.getLogger(__name__)
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+_host_locks = {}
+
+
+class IconTooBig(Exception):
+    pass
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=conf.ICON_FETCH_WORKERS)
+    return _executor
+
+
+def _get_host_lock(url):
+    host = urllib.parse.urlsplit(url).netloc
+    with _pending_lock:
+        if host not in _host_locks:
+            _host_locks[host] = threading.Lock()
+        return _host_locks[host]
+
+
+def download(url):
+    """Returns the content and the mimetype of the icon at url"""
+    response = requests.get(url, stream=True, verify=False,
+                            timeout=conf.ICON_FETCH_TIMEOUT,
+                            headers={'User-Agent': conf.CRAWLER_USER_AGENT})
+    try:
+        response.raise_for_status()
+        mimetype = response.headers.get('content-type')
+        if mimetype and not mimetype.startswith('image'):
+            raise ValueError('%r is not an image but %r' % (url, mimetype))
+        content = b''
+        for chunk in response.iter_content(4096):
+            content += chunk
+            if len(content) > conf.ICON_MAX_SIZE:
+                raise IconTooBig('%r is over %d bytes'
+                                 % (url, conf.ICON_MAX_SIZE))
+    finally:
+        response.close()
+    return content, mimetype
+
+
+def fetch(url):
+    """Retreives the icon at url and stores it, meant to run in the pool"""
+    from web.controllers import IconController, FeedController
+    try:
+        with _get_host_lock(url):
+            content, mimetype = download(url)
+        IconController().update({'url': url},
+                {'content': content, 'mimetype': mimetype,
+                 'last_attempt': datetime.utcnow()})
+        FeedController()._bump_versions(filters={'icon_url': url})
+        db.session.commit()
+    except Exception:
+        logger.exception('failed to retrieve icon %r', url)
+        db.session.rollback()
+        try:  # dating the failure so that the retrieval is tried again later
+            IconController().update({'url': url},
+                                    {'last_attempt': datetime.utcnow()})
+        except Exception:
+            db.session.rollback()
+    finally:
+        db.session.remove()
+        with _pending_lock:
+            _pending.discard(url)
+
+
+def schedule(url):
+    """Has the icon at url fetched unless it's already being, returns
+    whether it was scheduled"""
+    with _pending_lock:
+        if url in _pending:
+            return False
+        _pending.add(url)
+    get_executor().submit(fetch, url)
+    return True
+
+
+def shutdown(wait=True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
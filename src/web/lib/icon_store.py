@@ -0,0 +1,51 @@
+"""
+Content addressed store of the icons.
+
+Each icon is written once in conf.ICON_STORE_PATH, under the sha256 of its
+content, whatever the number of feeds (or urls) it's used by. A blob never
+changes once written, it is thus served under an url made of its digest
+which browsers can cache forever.
+"""
+
+import os
+import hashlib
+import tempfile
+
+from bootstrap import conf
+
+
+def get_digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_path(digest):
+    return os.path.join(conf.ICON_STORE_PATH, digest[:2], digest)
+
+
+def exists(digest):
+    return os.path.exists(get_path(digest))
+
+
+def store(content):
+    """Writes content in the store if it's not there yet, returns its
+    digest"""
+    digest = get_digest(content)
+    path = get_path(digest)
+    if os.path.exists(path):
+        return digest
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # written aside then moved so that a blob is never seen half written
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as fobj:
+            fobj.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return digest
+
+
+def load(digest):
+    with open(get_path(digest), 'rb') as fobj:
+        return fobj.read()
@@ -1,12 +1,23 @@
 import re
+import time
 import types
 import urllib
 import logging
 import requests
+import threading
 from hashlib import md5
+from concurrent.futures import ThreadPoolExecutor
 from flask import request, url_for
 
+from bootstrap import conf
+
 logger = logging.getLogger(__name__)
+ICON_PROBE_TTL = 6 * 3600
+_probes = {}
+_probes_lock = threading.Lock()
+_probe_executor = None
+HTML_TAGS_RE = re.compile('<[^>]+>')
+WHITE_SPACE_RE = re.compile('\s')
 
 
 def default_handler(obj, role='admin'):
@@ -41,25 +52,65 @@ def rebuild_url(url, base_split):
     return urllib.parse.urlunsplit(new_split)
 
 
-def try_get_icon_url(url, *splits):
-    for split in splits:
-        if split is None:
-            continue
-        rb_url = rebuild_url(url, split)
-        response = None
+def _probe_icon(url):
+    """Returns the final url of the icon at url, None if there's none"""
+    try:
+        response = requests.get(url, verify=False, stream=True,
+                timeout=conf.ICON_FETCH_TIMEOUT,
+                headers={'User-Agent': conf.CRAWLER_USER_AGENT})
+    except Exception:
+        return None
+    try:
+        content_type = response.headers.get('content-type', '')
         # if html in content-type, we assume it's a fancy 404 page
-        try:
-            response = requests.get(rb_url, verify=False, timeout=10)
-            content_type = response.headers.get('content-type', '')
-        except Exception:
-            pass
-        else:
-            if response is not None and response.ok \
-                    and 'html' not in content_type and response.content:
-                return response.url
+        if response.ok and 'html' not in content_type \
+                and next(response.iter_content(1024), None):
+            return response.url
+    except Exception:
+        pass
+    finally:
+        response.close()
+    return None
+
+
+def probe_icon(url):
+    """Has the icon at url probed in the background, returns the future of
+    its final url. Probes are shared (those in progress included) and kept
+    ICON_PROBE_TTL seconds."""
+    global _probe_executor
+    now = time.time()
+    with _probes_lock:
+        if _probe_executor is None:
+            _probe_executor = ThreadPoolExecutor(max_workers=8)
+        if url in _probes and _probes[url][0] > now:
+            return _probes[url][1]
+        if len(_probes) > 10000:
+            for key in [key for key, (expires, _) in _probes.items()
+                        if expires <= now]:
+                del _probes[key]
+        future = _probe_executor.submit(_probe_icon, url)
+        _probes[url] = now + ICON_PROBE_TTL, future
+        return future
+
+
+def find_icon_url(urls, *splits):
+    """Probes concurrently every url rebuilt against each split, returns
+    the first icon found, in that order"""
+    futures = []
+    for url in urls:
+        for split in splits:
+            if split is not None:
+                futures.append(probe_icon(rebuild_url(url, split)))
+    for future in futures:
+        if future.result():
+            return future.result()
     return None
 
 
+def try_get_icon_url(url, *splits):
+    return find_icon_url([url], *splits)
+
+
 def to_hash(text):
     return md5(text.encode('utf8') if hasattr(text, 'encode') else text)\
             .hexdigest()
@@ -70,9 +121,14 @@ def clear_string(data):
     Clear a string by removing HTML tags, HTML special caracters
     and consecutive white spaces (more that one).
     """
-    p = re.compile('<[^>]+>')  # HTML tags
-    q = re.compile('\s')  # consecutive white spaces
-    return p.sub('', q.sub(' ', data))
+    return HTML_TAGS_RE.sub('', WHITE_SPACE_RE.sub(' ', data))
+
+
+def title_fingerprint(title):
+    """Hash of title stripped of HTML tags, case and extra white spaces, two
+    articles having the same fingerprint are likely to be duplicates"""
+    return to_hash(' '.join(HTML_TAGS_RE.sub('', title or '').split())
+                   .casefold())
 
 
 def redirect_url(default='home'):
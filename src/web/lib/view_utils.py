@@ -8,7 +8,7 @@ def etag_match(func):
     def wrapper(*args, **kwargs):
         response = func(*args, **kwargs)
         if isinstance(response, Response):
-            etag = to_hash(response.data)
+            etag = response.headers.get('etag') or to_hash(response.data)
             headers = response.headers
         elif type(response) is str:
             etag = to_hash(response)
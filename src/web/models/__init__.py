@@ -3,6 +3,7 @@ from .user import User
 from .article import Article
 from .icon import Icon
 from .category import Category
+from . import full_text
 
 from sqlalchemy.engine import reflection
 from sqlalchemy.schema import (
@@ -23,6 +24,8 @@ def db_empty(db):
     # the transaction only applies if the DB supports
     # transactional DDL, i.e. Postgresql, MS SQL Server
     trans = conn.begin()
+    # sqlite's FTS table comes with shadow tables, dropping it first
+    full_text.drop(conn)
 
     inspector = reflection.Inspector.from_engine(db.engine)
 
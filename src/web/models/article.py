@@ -1,6 +1,7 @@
 from bootstrap import db
 from datetime import datetime
 from sqlalchemy import asc, desc, Index
+from web.models import full_text
 from web.models.right_mixin import RightMixin
 
 
@@ -16,6 +17,8 @@ class Article(db.Model, RightMixin):
     date = db.Column(db.DateTime(), default=datetime.utcnow)
     retrieved_date = db.Column(db.DateTime(), default=datetime.utcnow)
     readability_parsed = db.Column(db.Boolean(), default=False)
+    # hash of the normalized title, see web.lib.utils.title_fingerprint
+    title_fingerprint = db.Column(db.String(32))
 
     user_id = db.Column(db.Integer(), db.ForeignKey('user.id'))
     feed_id = db.Column(db.Integer(), db.ForeignKey('feed.id'))
@@ -24,6 +27,11 @@ class Article(db.Model, RightMixin):
     idx_article_uid = Index('user_id')
     idx_article_uid_cid = Index('user_id', 'category_id')
     idx_article_uid_fid = Index('user_id', 'feed_id')
+    __table_args__ = (
+            Index('idx_article_fid_rdate', 'feed_id', 'retrieved_date'),
+            Index('idx_article_uid_date_id', user_id, date.desc(), id),
+            Index('idx_article_fid_fingerprint', 'feed_id',
+                  'title_fingerprint'),)
 
     # api whitelists
     @staticmethod
@@ -56,3 +64,6 @@ class Article(db.Model, RightMixin):
         return "<Article(id=%d, entry_id=%s, title=%r, " \
                "date=%r, retrieved_date=%r)>" % (self.id, self.entry_id,
                        self.title, self.date, self.retrieved_date)
+
+
+full_text.install(Article.__table__)
@@ -7,6 +7,10 @@ class Category(db.Model, RightMixin):
     id = db.Column(db.Integer(), primary_key=True)
     name = db.Column(db.String())
 
+    # denormalized counters, maintained by ArticleController
+    unread_count = db.Column(db.Integer(), default=0, nullable=False)
+    article_count = db.Column(db.Integer(), default=0, nullable=False)
+
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 
     idx_category_uid = Index('user_id')
@@ -3,6 +3,7 @@ from datetime import datetime
 from sqlalchemy import desc, Index
 from sqlalchemy.orm import validates
 from web.models.right_mixin import RightMixin
+from web.models.types import JSONType
 
 
 class Feed(db.Model, RightMixin):
@@ -16,13 +17,23 @@ class Feed(db.Model, RightMixin):
     site_link = db.Column(db.String(), default="")
     enabled = db.Column(db.Boolean(), default=True)
     created_date = db.Column(db.DateTime(), default=datetime.utcnow)
-    filters = db.Column(db.PickleType, default=[])
+    filters = db.Column(JSONType(), default=[])
     readability_auto_parse = db.Column(db.Boolean(), default=False)
 
+    # denormalized counters, maintained by ArticleController
+    unread_count = db.Column(db.Integer(), default=0, nullable=False)
+    article_count = db.Column(db.Integer(), default=0, nullable=False)
+
     # cache handling
     etag = db.Column(db.String(), default="")
     last_modified = db.Column(db.String(), default="")
     last_retrieved = db.Column(db.DateTime(), default=datetime(1970, 1, 1))
+    next_retrieval = db.Column(db.DateTime(), default=datetime(1970, 1, 1))
+    # hash of the feed level fields the metadata (title, description, site
+    # link and icon) were last built from, see construct_feed_from
+    metadata_hash = db.Column(db.String(), default="")
+    metadata_refreshed = db.Column(db.DateTime(),
+                                   default=datetime(1970, 1, 1))
 
     # error logging
     last_error = db.Column(db.String(), default="")
@@ -38,6 +49,8 @@ class Feed(db.Model, RightMixin):
 
     idx_feed_uid_cid = Index('user_id', 'category_id')
     idx_feed_uid = Index('user_id')
+    __table_args__ = (
+            Index('idx_feed_fetchable', 'enabled', 'next_retrieval'),)
 
     # api whitelists
     @staticmethod
@@ -48,7 +61,8 @@ class Feed(db.Model, RightMixin):
 
     @staticmethod
     def _fields_base_read():
-        return {'id', 'user_id', 'icon_url', 'last_retrieved'}
+        return {'id', 'user_id', 'icon_url', 'last_retrieved',
+                'next_retrieval'}
 
     @staticmethod
     def _fields_api_write():
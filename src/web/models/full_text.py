@@ -0,0 +1,150 @@
+"""
+Full text search on the title and the content of the articles.
+
+On postgresql, both columns get a GIN index on their tsvector. Those being
+expression indexes, postgresql maintains them by itself on insert and
+update. On sqlite, an FTS5 table holds the index of both columns and the
+triggers created along with it keep it in sync with the article table.
+Databases (or sqlite builds) without any of those fall back on LIKE.
+Whether the index exists is looked up once per engine, creating or
+dropping it through this module resets that.
+"""
+
+import logging
+import weakref
+from sqlalchemy import (event, func, or_, false, desc, select, table, column,
+                        literal_column)
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+LANGUAGE = 'simple'
+FIELDS = ('title', 'content')
+# relevance of a match in each field
+WEIGHTS = {'title': 2.0, 'content': 1.0}
+FTS_TABLE = 'article_fts'
+fts = table(FTS_TABLE, column('rowid'))
+_available = weakref.WeakKeyDictionary()
+
+PG_CREATE = "CREATE INDEX idx_article_%(field)s_fts " \
+        "ON article USING gin " \
+        "(to_tsvector('%(language)s', coalesce(%(field)s, '')))"
+PG_DROP = "DROP INDEX IF EXISTS idx_article_%(field)s_fts"
+SQLITE_CREATE = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5("
+        "title, content, content='article', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS article_fts_insert "
+        "AFTER INSERT ON article BEGIN "
+        "INSERT INTO article_fts(rowid, title, content) "
+        "VALUES (new.id, new.title, new.content); END",
+        "CREATE TRIGGER IF NOT EXISTS article_fts_delete "
+        "AFTER DELETE ON article BEGIN "
+        "INSERT INTO article_fts(article_fts, rowid, title, content) "
+        "VALUES ('delete', old.id, old.title, old.content); END",
+        "CREATE TRIGGER IF NOT EXISTS article_fts_update "
+        "AFTER UPDATE OF title, content ON article BEGIN "
+        "INSERT INTO article_fts(article_fts, rowid, title, content) "
+        "VALUES ('delete', old.id, old.title, old.content); "
+        "INSERT INTO article_fts(rowid, title, content) "
+        "VALUES (new.id, new.title, new.content); END"]
+SQLITE_DROP = ["DROP TRIGGER IF EXISTS article_fts_insert",
+               "DROP TRIGGER IF EXISTS article_fts_delete",
+               "DROP TRIGGER IF EXISTS article_fts_update",
+               "DROP TABLE IF EXISTS article_fts"]
+
+
+def create(bind):
+    """Creates the full text index, on an existing article table"""
+    if bind.dialect.name == 'postgresql':
+        for field in FIELDS:
+            bind.execute(PG_CREATE % {'field': field, 'language': LANGUAGE})
+    elif bind.dialect.name == 'sqlite':
+        try:
+            for statement in SQLITE_CREATE:
+                bind.execute(statement)
+        except OperationalError:
+            logger.warn('sqlite has no FTS5, searches will be sequential')
+    _available.pop(bind.engine, None)
+
+
+def drop(bind):
+    if bind.dialect.name == 'postgresql':
+        for field in FIELDS:
+            bind.execute(PG_DROP % {'field': field})
+    elif bind.dialect.name == 'sqlite':
+        for statement in SQLITE_DROP:
+            bind.execute(statement)
+    _available.pop(bind.engine, None)
+
+
+def reindex(bind):
+    """Rebuilds the full text index from the article table"""
+    drop(bind)
+    create(bind)
+    if bind.dialect.name == 'sqlite' and is_available(bind):
+        bind.execute("INSERT INTO article_fts(article_fts) VALUES ('rebuild')")
+
+
+def install(article_table):
+    """Has the full text index created and dropped along article_table"""
+    event.listen(article_table, 'after_create',
+                 lambda target, connection, **kw: create(connection))
+    event.listen(article_table, 'before_drop',
+                 lambda target, connection, **kw: drop(connection))
+
+
+def is_available(bind):
+    if bind.dialect.name == 'postgresql':
+        return True
+    if bind.dialect.name == 'sqlite':
+        if bind.engine not in _available:
+            _available[bind.engine] = bind.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' "
+                    "AND name='article_fts'").scalar() is not None
+        return _available[bind.engine]
+    return False
+
+
+def _tsvector(model, field):
+    return func.to_tsvector(LANGUAGE,
+                            func.coalesce(getattr(model, field), ''))
+
+
+def _fts_query(terms, fields):
+    tokens = ['"%s"' % token.replace('"', '""') for token in terms.split()]
+    return '{%s} : (%s)' % (' '.join(fields), ' '.join(tokens))
+
+
+def match(bind, model, terms, fields=FIELDS):
+    """Returns the criterion for the objects of model having every word of
+    terms in one of fields"""
+    if not terms.split():
+        return false()
+    if bind.dialect.name == 'postgresql':
+        tsquery = func.plainto_tsquery(LANGUAGE, terms)
+        return or_(*[_tsvector(model, field).op('@@')(tsquery)
+                     for field in fields])
+    if is_available(bind):
+        return model.id.in_(select([fts.c.rowid]).where(
+                literal_column(FTS_TABLE).op('MATCH')(
+                    _fts_query(terms, fields))))
+    return or_(*[getattr(model, field).ilike('%%%s%%' % terms)
+                 for field in fields])
+
+
+def ranked(bind, query, model, terms, fields=FIELDS):
+    """Filters query on terms and orders it, the most relevant first"""
+    if not terms.split():
+        return query.filter(false())
+    if bind.dialect.name == 'postgresql':
+        tsquery = func.plainto_tsquery(LANGUAGE, terms)
+        rank = sum(func.ts_rank(_tsvector(model, field), tsquery)
+                   * WEIGHTS[field] for field in fields)
+        return query.filter(match(bind, model, terms, fields))\
+                .order_by(desc(rank))
+    if is_available(bind):
+        fts_table = literal_column(FTS_TABLE)
+        return query.join(fts, fts.c.rowid == model.id)\
+                .filter(fts_table.op('MATCH')(_fts_query(terms, fields)))\
+                .order_by(func.bm25(fts_table,
+                                    *[WEIGHTS[field] for field in FIELDS]))
+    return query.filter(match(bind, model, terms, fields))
@@ -1,7 +1,12 @@
+from datetime import datetime
+
 from bootstrap import db
 
 
 class Icon(db.Model):
     url = db.Column(db.String(), primary_key=True)
-    content = db.Column(db.String(), default=None)
+    # the content lies in web.lib.icon_store, under that digest
+    digest = db.Column(db.String(64), default=None, index=True)
     mimetype = db.Column(db.String(), default="application/image")
+    # last time the content was retrieved, or failed to be
+    last_attempt = db.Column(db.DateTime(), default=datetime.utcnow)
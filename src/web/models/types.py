@@ -0,0 +1,29 @@
+import json
+from sqlalchemy.types import TypeDecorator, Text
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+class JSONType(TypeDecorator):
+    """Stores json documents, as JSONB on postgresql (where they can be
+    queried and indexed) and as plain text elsewhere"""
+    impl = Text
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == 'postgresql':
+            return value
+        return json.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == 'postgresql':
+            return value
+        return json.loads(value)
+
+    @property
+    def python_type(self):
+        # as for PickleType, letting the API rely on the column's default
+        raise NotImplementedError()
@@ -32,6 +32,10 @@ class User(db.Model, UserMixin, RightMixin):
                             cascade='all,delete-orphan')
     readability_key = db.Column(db.String(), default='')
     renew_password_token = db.Column(db.String(), default='')
+    # incremented on each change of what the menu displays
+    menu_version = db.Column(db.Integer(), default=0, nullable=False)
+    # incremented on each change of the feeds
+    feeds_version = db.Column(db.Integer(), default=0, nullable=False)
 
     categories = relationship('Category', cascade='all, delete-orphan')
     feeds = relationship('Feed', cascade='all, delete-orphan')
@@ -11,14 +11,12 @@ import glob
 import logging
 import operator
 import urllib
-import itertools
 import subprocess
 import sqlalchemy
 try:
     from urlparse import urlparse, parse_qs, urlunparse
 except:
     from urllib.parse import urlparse, parse_qs, urlunparse, urljoin
-from datetime import timedelta
 from collections import Counter
 from contextlib import contextmanager
 from flask import request
@@ -161,13 +159,4 @@ def compare_documents(feed):
     Compare a list of documents by pair.
     Pairs of duplicates are sorted by "retrieved date".
     """
-    duplicates = []
-    for pair in itertools.combinations(feed.articles, 2):
-        date1, date2 = pair[0].date, pair[1].date
-        if clear_string(pair[0].title) == clear_string(pair[1].title) and \
-                                        (date1 - date2) < timedelta(days=1):
-            if pair[0].retrieved_date < pair[1].retrieved_date:
-                duplicates.append((pair[0], pair[1]))
-            else:
-                duplicates.append((pair[1], pair[0]))
-    return duplicates
+    return controllers.FeedController(feed.user_id).get_duplicates(feed.id)[1]
@@ -8,7 +8,7 @@ from flask.ext.login import login_required, current_user
 
 from web.views.common import admin_permission
 from web.lib.utils import redirect_url
-from web.controllers import UserController, FeedController, ArticleController
+from web.controllers import UserController, FeedController
 
 logger = logging.getLogger(__name__)
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -42,11 +42,12 @@ def user(user_id=None):
     """
     user = UserController().get(id=user_id)
     if user is not None:
-        article_contr = ArticleController(user_id)
-        return render_template('/admin/user.html', user=user,
-                feeds=FeedController().read(user_id=user_id).order_by('title'),
-                article_count=article_contr.count_by_feed(),
-                unread_article_count=article_contr.count_by_feed(readed=False))
+        feeds = FeedController().read(user_id=user_id).order_by('title')\
+                .all()
+        return render_template('/admin/user.html', user=user, feeds=feeds,
+                article_count={feed.id: feed.article_count for feed in feeds},
+                unread_article_count={feed.id: feed.unread_count
+                                      for feed in feeds})
 
     else:
         flash(gettext('This user does not exist.'), 'warn')
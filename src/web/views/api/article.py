@@ -41,7 +41,7 @@ class ArticlesChallenge(PyAggAbstractResource):
             for key in keys_to_ignore:
                 del id_dict[key]
 
-        result = list(self.controller.challenge(parsed_args['ids']))
+        result = self.controller.batch_challenge(parsed_args['ids'])
         return result or None, 200 if result else 204
 
 api = Api(current_app, prefix=conf.API_ROOT)
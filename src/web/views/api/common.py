@@ -160,19 +160,24 @@ class PyAggResourceMulti(PyAggAbstractResource):
         >>> payload
         [{attr1: val1, attr2: val2}, {attr1: val1, attr2: val2}]
         """
-        status, fail_count, results = 200, 0, []
+        status, results = 200, []
 
         class Proxy:
             pass
         for attrs in request.json:
             try:
                 Proxy.json = attrs
-                args = self.reqparse_args('write', req=Proxy, default=False)
-                obj = self.controller.create(**args)
-                results.append(obj)
+                results.append(
+                        self.reqparse_args('write', req=Proxy, default=False))
             except Exception as error:
-                fail_count += 1
-                results.append(str(error))
+                results.append(error)
+        created = iter(self.controller.create_many(
+                [args for args in results if not isinstance(args, Exception)]))
+        results = [res if isinstance(res, Exception) else next(created)
+                   for res in results]
+        fail_count = sum(isinstance(res, Exception) for res in results)
+        results = [str(res) if isinstance(res, Exception) else res
+                   for res in results]
         if fail_count == len(results):  # all failed => 500
             status = 500
         elif fail_count:  # some failed => 206
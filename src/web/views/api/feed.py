@@ -27,7 +27,7 @@ class FetchableFeedAPI(PyAggAbstractResource):
     controller_cls = FeedController
     attrs = {'max_error': {'type': int, 'default': conf.FEED_ERROR_MAX},
              'limit': {'type': int, 'default': DEFAULT_LIMIT},
-             'refresh_rate': {'type': int, 'default': conf.FEED_REFRESH_RATE}}
+             'refresh_rate': {'type': int, 'default': None}}
 
     @api_permission.require(http_exception=403)
     def get(self):
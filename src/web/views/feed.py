@@ -11,7 +11,7 @@ from bootstrap import conf
 from web import utils
 from web.lib.view_utils import etag_match
 from web.lib.feed_utils import construct_feed_from
-from web.controllers import FeedController, ArticleController
+from web.controllers import FeedController
 
 logger = logging.getLogger(__name__)
 feeds_bp = Blueprint('feeds', __name__, url_prefix='/feeds')
@@ -23,11 +23,11 @@ feed_bp = Blueprint('feed', __name__, url_prefix='/feed')
 @etag_match
 def feeds():
     "Lists the subscribed  feeds in a table."
-    art_contr = ArticleController(current_user.id)
-    return render_template('feeds.html',
-            feeds=FeedController(current_user.id).read(),
-            unread_article_count=art_contr.count_by_feed(readed=False),
-            article_count=art_contr.count_by_feed())
+    feeds = FeedController(current_user.id).read().all()
+    return render_template('feeds.html', feeds=feeds,
+            unread_article_count={feed.id: feed.unread_count
+                                  for feed in feeds},
+            article_count={feed.id: feed.article_count for feed in feeds})
 
 
 @feed_bp.route('/bookmarklet', methods=['GET', 'POST'])
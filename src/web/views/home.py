@@ -1,27 +1,42 @@
+import time
 import pytz
+import calendar
 import logging
+import dateutil.parser
 from datetime import datetime
+from collections import Counter, namedtuple
 
-from flask import (current_app, render_template,
-                   request, flash, url_for, redirect)
+from flask import (current_app, render_template, Response,
+                   request, flash, redirect)
 from flask.ext.login import login_required, current_user
 from flask.ext.babel import gettext, get_locale
+from werkzeug.exceptions import BadRequest
 from babel.dates import format_datetime, format_timedelta
 
 from bootstrap import conf
-from web.lib.utils import redirect_url
+from web.lib.utils import redirect_url, to_hash
 from web.lib.article_cleaner import clean_urls
 from web import utils
 from web.lib.view_utils import etag_match
 from web.views.common import jsonify
+from web.views.icon import icon_url_for
 
+from web.models import Feed, Icon
 from web.controllers import (UserController, CategoryController,
-                             FeedController, ArticleController)
+                             FeedController, ArticleController,
+                             IconController)
 
 from plugins import readability
 
 localize = pytz.utc.localize
 logger = logging.getLogger(__name__)
+# the menu holds relative dates, they won't be too stale with this
+MENU_CACHE_TTL = 60
+MenuCacheEntry = namedtuple('MenuCacheEntry',
+                            ['version', 'expires', 'body', 'etag'])
+_menu_cache = {}
+FeedsCacheEntry = namedtuple('FeedsCacheEntry', ['version', 'feeds'])
+_feeds_cache = {}
 
 
 @current_app.route('/')
@@ -30,25 +45,44 @@ logger = logging.getLogger(__name__)
 def home():
     UserController(current_user.id).update({'id': current_user.id},
             {'last_connection': datetime.utcnow()})
-    return render_template('home.html')
+    return render_template('home.html',
+                           lang=str(get_locale()).replace('_', '-'))
 
 
 @current_app.route('/menu')
 @login_required
 @etag_match
-@jsonify
 def get_menu():
+    """Serves the menu from a per user cache, which is valid as long as the
+    menu version of the user hasn't been bumped by a change on its
+    articles, feeds or categories"""
+    # creation date prevents a reused id from hitting a former user's menu
+    key = current_user.id, current_user.date_created, str(get_locale())
+    cached = _menu_cache.get(key)
+    if cached is None or cached.version != current_user.menu_version \
+            or cached.expires < time.time():
+        body = _build_menu().data
+        cached = _menu_cache[key] = MenuCacheEntry(current_user.menu_version,
+                time.time() + MENU_CACHE_TTL, body, to_hash(body))
+    response = Response(cached.body, mimetype='application/json')
+    response.headers['etag'] = cached.etag
+    return response
+
+
+@jsonify
+def _build_menu():
     now, locale = datetime.now(), get_locale()
     categories_order = [0]
     categories = {0: {'name': 'No category', 'id': 0}}
     for cat in CategoryController(current_user.id).read().order_by('name'):
         categories_order.append(cat.id)
         categories[cat.id] = cat
-    unread = ArticleController(current_user.id).count_by_feed(readed=False)
-    for cat_id in categories:
-        categories[cat_id]['unread'] = 0
-        categories[cat_id]['feeds'] = []
+    for cat_id, cat in categories.items():
+        cat['unread'] = cat.unread_count if cat_id else 0
+        cat['feeds'] = []
     feeds = {feed.id: feed for feed in FeedController(current_user.id).read()}
+    digests = IconController().get_digests(feed.icon_url
+                                           for feed in feeds.values())
     for feed_id, feed in feeds.items():
         feed['created_rel'] = format_timedelta(feed.created_date - now,
                 add_direction=True, locale=locale)
@@ -59,12 +93,13 @@ def get_menu():
         feed['last_retrieved'] = format_datetime(localize(feed.last_retrieved),
                                                  locale=locale)
         feed['category_id'] = feed.category_id or 0
-        feed['unread'] = unread.get(feed.id, 0)
+        feed['unread'] = feed.unread_count
         if not feed.filters:
             feed['filters'] = []
         if feed.icon_url:
-            feed['icon_url'] = url_for('icon.icon', url=feed.icon_url)
-        categories[feed['category_id']]['unread'] += feed['unread']
+            feed['icon_url'] = icon_url_for(digests.get(feed.icon_url))
+        if not feed.category_id:
+            categories[0]['unread'] += feed['unread']
         categories[feed['category_id']]['feeds'].append(feed_id)
     return {'feeds': feeds, 'categories': categories,
             'categories_order': categories_order,
@@ -72,27 +107,16 @@ def get_menu():
             'max_error': conf.FEED_ERROR_MAX,
             'error_threshold': conf.FEED_ERROR_THRESHOLD,
             'is_admin': current_user.is_admin,
-            'all_unread_count': sum(unread.values())}
+            'all_unread_count': sum(feed['unread'] for feed in feeds.values())}
 
 
 def _get_filters(in_dict):
+    filters = {}
     query = in_dict.get('query')
     if query:
-        search_title = in_dict.get('search_title') == 'true'
-        search_content = in_dict.get('search_content') == 'true'
-        filters = []
-        if search_title:
-            filters.append({'title__ilike': "%%%s%%" % query})
-        if search_content:
-            filters.append({'content__ilike': "%%%s%%" % query})
-        if len(filters) == 0:
-            filters.append({'title__ilike': "%%%s%%" % query})
-        if len(filters) == 1:
-            filters = filters[0]
-        else:
-            filters = {"__or__": filters}
-    else:
-        filters = {}
+        fields = tuple(field for field in ('title', 'content')
+                       if in_dict.get('search_%s' % field) in (True, 'true'))
+        filters['__search__'] = (query, fields or ('title',))
     if in_dict.get('filter') == 'unread':
         filters['readed'] = False
     elif in_dict.get('filter') == 'liked':
@@ -103,24 +127,50 @@ def _get_filters(in_dict):
     return filters
 
 
-@jsonify
-def _articles_to_json(articles):
-    now, locale = datetime.now(), get_locale()
-    fd_hash = {feed.id: {'title': feed.title,
-                         'icon_url': url_for('icon.icon', url=feed.icon_url)
-                                     if feed.icon_url else None}
-               for feed in FeedController(current_user.id).read()}
+def _parse_cursor(cursor):
+    try:
+        date, id_ = cursor.rsplit(';', 1)
+        return dateutil.parser.parse(date), int(id_)
+    except (ValueError, OverflowError):
+        raise BadRequest('invalid cursor %r' % cursor)
+
 
+def _parse_offset(offset):
+    try:
+        return max(int(offset), 0)
+    except ValueError:
+        raise BadRequest('invalid offset %r' % offset)
+
+
+def _get_feeds_metadata():
+    """Returns the title and icon url of each feed of the current user, from
+    a per user cache which is valid as long as the feeds version of the user
+    hasn't been bumped by a change on its feeds"""
+    key = current_user.id, current_user.date_created
+    cached = _feeds_cache.get(key)
+    if cached is None or cached.version != current_user.feeds_version:
+        feeds = {}
+        for feed_id, title, digest in FeedController(current_user.id)\
+                .read().outerjoin(Icon, Icon.url == Feed.icon_url)\
+                .with_entities(Feed.id, Feed.title, Icon.digest):
+            feeds[feed_id] = {'title': title, 'icon_url': icon_url_for(digest)}
+        cached = _feeds_cache[key] = FeedsCacheEntry(
+                current_user.feeds_version, feeds)
+    return cached.feeds
+
+
+@jsonify
+def _articles_to_json(articles, next_page=None):
+    fd_hash = _get_feeds_metadata()
+    # dates are sent as epoch timestamps, the client localizes them
     return {'articles': [{'title': art.title, 'liked': art.like,
             'read': art.readed, 'article_id': art.id, 'selected': False,
             'feed_id': art.feed_id, 'category_id': art.category_id or 0,
             'feed_title': fd_hash[art.feed_id]['title'],
             'icon_url': fd_hash[art.feed_id]['icon_url'],
-            'date': format_datetime(localize(art.date), locale=locale),
-            'rel_date': format_timedelta(art.date - now,
-                    threshold=1.1, add_direction=True,
-                    locale=locale)}
-            for art in articles.limit(1000)]}
+            'timestamp': calendar.timegm(art.date.utctimetuple())}
+            for art in articles],
+            'next_page': next_page}
 
 
 @current_app.route('/middle_panel')
@@ -128,9 +178,20 @@ def _articles_to_json(articles):
 @etag_match
 def get_middle_panel():
     filters = _get_filters(request.args)
-    art_contr = ArticleController(current_user.id)
-    articles = art_contr.read_light(**filters)
-    return _articles_to_json(articles)
+    cursor = request.args.get('cursor')
+    acontr = ArticleController(current_user.id)
+    if '__search__' in filters:
+        # searches are ranked by relevance, paginated by offset
+        terms, fields = filters.pop('__search__')
+        articles, offset = acontr.search(terms, fields,
+                _parse_offset(cursor) if cursor else 0, **filters)
+        return _articles_to_json(articles,
+                                 str(offset) if offset is not None else None)
+    articles, cursor = acontr.read_page(
+            _parse_cursor(cursor) if cursor else None, **filters)
+    return _articles_to_json(articles, '%s;%d' % (cursor[0].isoformat(),
+                                                  cursor[1])
+                                       if cursor else None)
 
 
 @current_app.route('/getart/<int:article_id>')
@@ -146,8 +207,8 @@ def get_article(article_id, parse=False):
         contr.update({'id': article_id}, {'readed': True})
     article['category_id'] = article.category_id or 0
     feed = FeedController(current_user.id).get(id=article.feed_id)
-    article['icon_url'] = url_for('icon.icon', url=feed.icon_url) \
-            if feed.icon_url else None
+    article['icon_url'] = icon_url_for(
+            IconController().get_digests([feed.icon_url]).get(feed.icon_url))
     readability_available = bool(current_user.readability_key
                                  or conf.PLUGINS_READABILITY_KEY)
     article['date'] = format_datetime(localize(article.date), locale=locale)
@@ -171,12 +232,19 @@ def get_article(article_id, parse=False):
 
 @current_app.route('/mark_all_as_read', methods=['PUT'])
 @login_required
+@jsonify
 def mark_all_as_read():
+    """Marks the articles matching the filters as read and returns the delta
+    the client applies to its state: the ids of the articles that were
+    unread and how many of them each feed and category had"""
     filters = _get_filters(request.json)
-    acontr = ArticleController(current_user.id)
-    processed_articles = _articles_to_json(acontr.read_light(**filters))
-    acontr.update(filters, {'readed': True})
-    return processed_articles
+    rows = ArticleController(current_user.id).mark_as_read(**filters)
+    feeds, categories = Counter(), Counter()
+    for _, feed_id, category_id, _ in rows:
+        feeds[feed_id] += 1
+        categories[category_id or 0] += 1
+    return {'articles': [row[0] for row in rows],
+            'feeds': feeds, 'categories': categories}
 
 
 @current_app.route('/fetch', methods=['GET'])
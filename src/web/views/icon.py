@@ -1,15 +1,39 @@
-import base64
-from flask import Blueprint, Response, request
+from flask import Blueprint, request, redirect, url_for, send_file
+from werkzeug.exceptions import NotFound
 from web.controllers import IconController
-from web.lib.view_utils import etag_match
+from web.lib import icon_store
 
 icon_bp = Blueprint('icon', __name__, url_prefix='/icon')
+# a blob never changes, so won't its mimetype
+_mimetypes = {}
+
+
+def icon_url_for(digest):
+    return url_for('icon.blob', digest=digest) if digest else None
 
 
 @icon_bp.route('/', methods=['GET'])
-@etag_match
 def icon():
+    """Redirects to the immutable url of the icon at url"""
     icon = IconController().get(url=request.args['url'])
-    headers = {'Cache-Control': 'max-age=86400',
-               'Content-Type': icon.mimetype}
-    return Response(base64.b64decode(icon.content), headers=headers)
+    if not icon.digest:
+        raise NotFound()
+    response = redirect(icon_url_for(icon.digest))
+    response.headers['Cache-Control'] = 'max-age=86400'
+    return response
+
+
+@icon_bp.route('/<string(length=64):digest>', methods=['GET'])
+def blob(digest):
+    if digest not in _mimetypes:
+        icon = IconController().read(digest=digest).first()
+        if icon is None or not icon_store.exists(digest):
+            raise NotFound()
+        _mimetypes[digest] = icon.mimetype
+    response = send_file(icon_store.get_path(digest),
+                         mimetype=_mimetypes[digest], add_etags=False)
+    # the digest is the strongest of etags, no need to hash the file again
+    response.set_etag(digest)
+    response.headers['Cache-Control'] \
+            = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)